@@ -42,6 +42,7 @@
 """
 
 import sys
+import multiprocessing
 import webbrowser
 from PySide6 import QtWidgets, QtCore, QtGui
 from PySide6.QtCore import QThread, QFile
@@ -49,16 +50,18 @@ from PySide6.QtUiTools import QUiLoader
 from PySide6.QtCore import Slot
 
 import numpy as np
-import matplotlib.cm as cm
 
 from calpattern import CalPattern
+from processengine import ProcessCalPattern
+from patternio import save_npz
+from arraylayout import get_layout, save_binary, unsteered_weight
+from stagetiming import StageTimer, NULL_TIMER, TimingLog, format_summary, now
 
 import pyqtgraph as pg
-import pyqtgraph.opengl as gl
 
 
 class AntArrayAnalysis(QtWidgets.QMainWindow):
-    def __init__(self):
+    def __init__(self, engine_process=False, timing=False):
         super(AntArrayAnalysis, self).__init__()
 
         """Constants"""
@@ -66,7 +69,20 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
         self.plot_list = ['3D (Az-El-Amp)', '2D Cartesian', '2D Polar',
                           'Array layout']
         self.array_config = dict()
+        self.pattern_generation = 0
+        self.frame_config = dict()
         self.fix_azimuth = False
+        self.cut_axis = 'Angle'
+
+        # Imported layout file, None for the rectangular array
+        self.array_file = None
+
+        # Stage timing, off unless asked for. The time of each request is
+        # kept until its frame is painted to get the end-to-end latency.
+        self.timing = timing
+        self.timing_log = TimingLog()
+        self.request_times = dict()
+        self.dropped_frames = 0
 
         """Load UI"""
         ui_file_name = "ui_array_analysis.ui"
@@ -76,7 +92,13 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
         ui_file.close()
 
         """Antenna array configuration"""
-        self.calpattern = CalPattern()
+        # The engine can run in its own process so heavy patterns do not
+        # hold the GIL of the GUI
+        if engine_process:
+            self.calpattern = ProcessCalPattern()
+        else:
+            self.calpattern = CalPattern()
+        self.calpattern.engineFailed.connect(self.engine_failed)
         self.calpattern_thread = QThread()
         self.calpattern.patternReady.connect(self.update_figure)
         self.calpattern_thread.started.connect(
@@ -140,11 +162,24 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
         self.ui.spinBox_polarMinAmp.setVisible(False)
         self.ui.horizontalSlider_polarMinAmp.setVisible(False)
 
+        self.ui.actionImport_array_config.triggered.connect(
+            self.import_array_config)
+        self.ui.actionClear.triggered.connect(self.clear_array_config)
+        self.ui.actionClear.setEnabled(False)
         self.ui.actionExport_array_config.triggered.connect(
             self.export_array_config)
         self.ui.actionExport_pattern_data.triggered.connect(
             self.export_pattern)
 
+        self.ui.actionExport_timing_log.triggered.connect(
+            self.export_timing_log)
+
+        self.timing_label = QtWidgets.QLabel()
+        self.ui.statusBar().addPermanentWidget(self.timing_label)
+        self.timing_label.setVisible(self.timing)
+        self.ui.actionShow_timing.setChecked(self.timing)
+        self.ui.actionShow_timing.toggled.connect(self.show_timing)
+
         self.ui.actionQuit.triggered.connect(self.quit)
 
         # self.ui.actionReset_config.triggered.connect(self.reset_config)
@@ -153,24 +188,48 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
         self.ui.actionAbout.triggered.connect(self.about)
 
     def init_figure(self):
-        """Init figures"""
-        self.canvas2d_cartesian = pg.GraphicsLayoutWidget()
-        self.canvas2d_polar = pg.GraphicsLayoutWidget()
-        self.canvas3d = gl.GLViewWidget()
-        self.canvas3d_array = pg.GraphicsLayoutWidget()
+        """Init figures
+
+        Only the canvas of the selected plot type is built here, the others
+        are built when :meth:`plot_type_changed` first selects them.
+        """
+        self.canvases = dict()
+        self.builders = {
+            '3D (Az-El-Amp)': self.init_surface_view,
+            '2D Cartesian': self.init_cartesian_view,
+            '2D Polar': self.init_polar_view,
+            'Array layout': self.init_array_view
+        }
 
-        self.ui.layout_canvas.addWidget(self.canvas3d)
-        self.ui.layout_canvas.addWidget(self.canvas3d_array)
-        self.ui.layout_canvas.addWidget(self.canvas2d_cartesian)
-        self.ui.layout_canvas.addWidget(self.canvas2d_polar)
+        self.penActive = pg.mkPen(color=(244, 143, 177), width=1)
+        self.penHold = pg.mkPen(color=(158, 158, 158), width=1)
+        self.polarAmpOffset = 60
 
         self.plot_type_changed(self.ui.cb_plottype.currentIndex())
 
+    def canvas(self, plot):
+        """Canvas of a plot type, built and added to the layout on first use
+        """
+        canvas = self.canvases.get(plot)
+        if canvas is None:
+            canvas = self.builders[plot]()
+            self.ui.layout_canvas.addWidget(canvas)
+            self.canvases[plot] = canvas
+        return canvas
+
+    def show_canvas(self, plot):
+        canvas = self.canvas(plot)
+        for other in self.canvases.values():
+            if other is not canvas:
+                other.setVisible(False)
+        canvas.setVisible(True)
+
+    def init_surface_view(self):
         """Surface view"""
-        self.cmap = cm.get_cmap('jet')
-        self.minZ = -100
-        self.maxZ = 0
+        # OpenGL is only loaded when the 3D view is first shown
+        import pyqtgraph.opengl as gl
 
+        self.canvas3d = gl.GLViewWidget()
         self.surface_plot = gl.GLSurfacePlotItem(computeNormals=False)
         self.surface_plot.translate(0, 0, 100)
 
@@ -199,8 +258,11 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
 
         self.canvas3d.addItem(self.surface_plot)
         self.canvas3d.setCameraPosition(distance=300)
+        return self.canvas3d
 
+    def init_array_view(self):
         """Array view"""
+        self.canvas3d_array = pg.GraphicsLayoutWidget()
         self.array_view = pg.PlotItem()
         self.array_plot = pg.ScatterPlotItem()
         self.canvas3d_array.addItem(self.array_view)
@@ -214,31 +276,35 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
 
         self.array_plot.setPen(pg.mkPen(color=(244, 143, 177, 120), width=1))
         self.array_plot.setBrush(pg.mkBrush(244, 143, 177, 200))
+        return self.canvas3d_array
 
+    def init_cartesian_view(self):
         """Cartesian view"""
+        self.canvas2d_cartesian = pg.GraphicsLayoutWidget()
         self.cartesianView = pg.PlotItem()
         self.cartesianPlot = pg.PlotDataItem()
         self.cartesianPlotHold = pg.PlotDataItem()
 
         self.canvas2d_cartesian.addItem(self.cartesianView)
 
-        self.penActive = pg.mkPen(color=(244, 143, 177), width=1)
-        self.penHold = pg.mkPen(color=(158, 158, 158), width=1)
-
         self.cartesianPlot.setPen(self.penActive)
         self.cartesianPlotHold.setPen(self.penHold)
         self.cartesianView.addItem(self.cartesianPlot)
 
         self.cartesianView.setXRange(-90, 90)
         self.cartesianView.setYRange(-80, 0)
-        self.cartesianView.setLabel(axis='bottom', text='Angle', units='°')
+        self.cartesianView.setLabel(
+            axis='bottom', text=self.cut_axis, units='°')
         self.cartesianView.setLabel(
             axis='left', text='Normalized amplitude', units='dB')
         self.cartesianView.showGrid(x=True, y=True, alpha=0.5)
         self.cartesianView.setLimits(
             xMin=-90, xMax=90, yMin=-110, yMax=1, minXRange=0.1, minYRange=0.1)
+        return self.canvas2d_cartesian
 
+    def init_polar_view(self):
         """Polar view"""
+        self.canvas2d_polar = pg.GraphicsLayoutWidget()
         self.polarView = pg.PlotItem()
         self.polarPlot = pg.PlotDataItem()
         self.polarPlotHold = pg.PlotDataItem()
@@ -247,8 +313,6 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
         self.circleList = []
         self.circleLabel = []
 
-        self.polarAmpOffset = 60
-
         self.polarPlot.setPen(self.penActive)
         self.polarPlotHold.setPen(self.penHold)
         self.polarView.addItem(self.polarPlot)
@@ -288,6 +352,15 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
         self.polarView.addLine(y=0, pen=0.3).setAngle(45)
         self.polarView.addLine(y=0, pen=0.3).setAngle(-45)
         self.polarView.setMouseEnabled(x=False, y=False)
+        return self.canvas2d_polar
+
+    def set_cut_axis(self, text):
+        """Label of the angle axis of the Cartesian view, kept until the
+        view is built
+        """
+        self.cut_axis = text
+        if '2D Cartesian' in self.canvases:
+            self.cartesianView.setLabel(axis='bottom', text=text, units='°')
 
     def az_changed(self, value):
         self.ui.hs_angleaz.setValue(value * 10)
@@ -338,7 +411,7 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
         self.ui.rbhs_elevation.setEnabled(False)
         self.nfft_az = 1
         self.nfft_el = 4096
-        self.cartesianView.setLabel(axis='bottom', text='Elevation', units='°')
+        self.set_cut_axis('Elevation')
         self.new_params()
 
     def rb_elevation_clicked(self):
@@ -350,7 +423,7 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
         self.ui.rbhs_azimuth.setEnabled(False)
         self.nfft_az = 4096
         self.nfft_el = 1
-        self.cartesianView.setLabel(axis='bottom', text='Azimuth', units='°')
+        self.set_cut_axis('Azimuth')
         self.new_params()
 
     def polar_min_amp_value_changed(self, value):
@@ -380,42 +453,98 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
         self.array_config['nfft_el'] = self.nfft_el
         self.array_config['plot_az'] = self.ui.rbsb_azimuth.value()
         self.array_config['plot_el'] = self.ui.rbsb_elevation.value()
+        self.array_config['timing'] = self.timing
+        self.array_config['array_file'] = self.array_file
+
+        requested = now()
+        self.pattern_generation = self.calpattern.update_config(
+            self.array_config)
+        if self.timing:
+            self.request_times[self.pattern_generation] = requested
+
+    def update_figure(self, generation, metrics):
+        if generation < self.pattern_generation:
+            self.dropped_frames += 1
+            return
+
+        timer = StageTimer() if 'timing' in metrics else NULL_TIMER
+        self.show_metrics(metrics)
+        self.frame_config = dict(self.array_config)
+
+        # The frame is a view of the worker's front buffer, which cannot be
+        # swapped while it is held
+        with self.calpattern.buffer.front() as (_, frame):
+            self.plot_frame(frame)
+        timer.mark('plot')
+
+        if 'timing' in metrics:
+            # Paint now instead of on the next event loop pass, so the
+            # paint and the GL upload are part of the timed frame
+            self.plot_canvas().repaint()
+            timer.mark('paint')
+            self.log_timing(generation, metrics['timing'], timer)
+
+    def plot_canvas(self):
+        return self.canvas(self.plot_list[self.plot_type_idx])
+
+    def log_timing(self, generation, timing, timer):
+        """Add a painted frame to the timing log and show the summary
+
+        :param dict timing: worker timing sent along with the metrics
+        :param timer: GUI stages of the frame, started when it arrived
+        """
+        record = dict(timing['stages'])
+        record.update(timer.stages)
+        record['transfer'] = timer.start - timing['published']
+        record['worker'] = sum(timing['stages'].values())
+
+        # The coarse and the refined frame of a progressive update both
+        # count from the same request, older requests are answered
+        requested = self.request_times.get(generation)
+        if requested is not None:
+            record['latency'] = timer.last - requested
+        self.request_times = {
+            gen: time for gen, time in self.request_times.items()
+            if gen >= generation}
+
+        record.update(
+            time=timer.last, generation=generation,
+            nfft_az=timing['nfft_az'], nfft_el=timing['nfft_el'],
+            coalesced=timing['coalesced'],
+            dropped=timing['dropped'] + self.dropped_frames)
+        self.timing_log.add(record)
+        self.timing_label.setText(format_summary(self.timing_log.summary()))
+
+    def show_timing(self, checked):
+        self.timing = checked
+        self.timing_label.setVisible(checked)
+        if not checked:
+            self.request_times.clear()
+        self.new_params()
 
-        self.calpattern.update_config(self.array_config)
-
-    def update_figure(self, azimuth, elevation, pattern, x, y, weight):
-        self.exp_config = np.zeros((np.shape(x)[0], 4))
-        self.exp_config[:, 0] = x
-        self.exp_config[:, 1] = y
-        self.exp_config[:, 2] = np.abs(weight)
-        self.exp_config[:, 3] = np.angle(weight)/np.pi*180
-
-        el_grid, az_grid = np.meshgrid(elevation, azimuth)
-        el_ravel = el_grid.ravel()
-        az_ravel = az_grid.ravel()
-        self.exp_pattern = np.zeros((np.shape(el_ravel)[0], 3))
-        self.exp_pattern[:, 0] = az_ravel
-        self.exp_pattern[:, 1] = el_ravel
-        self.exp_pattern[:, 2] = pattern.ravel()
-
+    def plot_frame(self, frame):
+        surface = frame['colors'].size > 0
         if self.plot_list[self.plot_type_idx] == '3D (Az-El-Amp)':
-            rgba_img = self.cmap((pattern-self.minZ)/(self.maxZ - self.minZ))
+            if not surface:
+                return
+            # MeshData keeps a reference to the colors, which point into
+            # the frame buffer the engine writes the next frame to
             self.surface_plot.setData(
-                x=azimuth, y=elevation, z=pattern, colors=rgba_img)
+                x=frame['render_azimuth'], y=frame['render_elevation'],
+                z=frame['render_pattern'], colors=frame['colors'].copy())
         elif self.plot_list[self.plot_type_idx] == '2D Cartesian':
-            if self.fix_azimuth:
-                self.cartesianPlot.setData(elevation, pattern)
-            else:
-                self.cartesianPlot.setData(azimuth, pattern)
+            if surface:
+                return
+            # PlotDataItem keeps references, so hand it copies of the cut
+            self.cartesianPlot.setData(
+                frame['render_azimuth'].copy(), frame['render_pattern'].copy())
         elif self.plot_list[self.plot_type_idx] == '2D Polar':
-            pattern = pattern + self.polarAmpOffset
+            if surface:
+                return
+            pattern = frame['render_pattern'] + self.polarAmpOffset
             pattern[np.where(pattern < 0)] = 0
-            if self.fix_azimuth:
-                x = pattern * np.sin(elevation / 180 * np.pi)
-                y = pattern * np.cos(elevation / 180 * np.pi)
-            else:
-                x = pattern * np.sin(azimuth / 180 * np.pi)
-                y = pattern * np.cos(azimuth / 180 * np.pi)
+            x = pattern * np.sin(frame['render_azimuth'] / 180 * np.pi)
+            y = pattern * np.cos(frame['render_azimuth'] / 180 * np.pi)
 
             self.circleLabel[0].setPos(self.polarAmpOffset, 0)
             for circle_idx in range(0, 6):
@@ -435,7 +564,26 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
                         circle_idx + 1), 0)
             self.polarPlot.setData(x, y)
         elif self.plot_list[self.plot_type_idx] == 'Array layout':
-            self.array_plot.setData(x=x, y=y, size=6)
+            self.array_plot.setData(x=frame['x'], y=frame['y'], size=6)
+
+    def show_metrics(self, metrics):
+        text = []
+        for axis, label in [('azimuth', 'Az'), ('elevation', 'El')]:
+            cut = metrics[axis]
+            if cut is None:
+                continue
+            text.append('{} peak {:.2f}°, HPBW {:.2f}°, SLL {:.1f} dB'.format(
+                label, float(cut['peak_angle']), float(cut['hpbw']),
+                float(cut['sll'])))
+            if cut['grating_lobe']:
+                text.append('{} grating lobe'.format(label))
+        if np.isfinite(metrics['directivity']):
+            text.append('Directivity {:.2f} dBi'.format(
+                10 * np.log10(metrics['directivity'])))
+        self.ui.statusBar().showMessage('  |  '.join(text))
+
+    def engine_failed(self, generation, message):
+        self.ui.statusBar().showMessage(message)
 
     def windowx_config(self, window_idx):
         if self.window_list[window_idx] == 'Chebyshev':
@@ -486,10 +634,7 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
     def plot_type_changed(self, plot_idx):
         self.plot_type_idx = plot_idx
         if self.plot_list[plot_idx] == '3D (Az-El-Amp)':
-            self.canvas2d_cartesian.setVisible(False)
-            self.canvas2d_polar.setVisible(False)
-            self.canvas3d_array.setVisible(False)
-            self.canvas3d.setVisible(True)
+            self.show_canvas('3D (Az-El-Amp)')
 
             self.ui.rb_azimuth.setEnabled(False)
             self.ui.rbsb_azimuth.setEnabled(False)
@@ -505,10 +650,7 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
             self.nfft_el = 512
             self.new_params()
         elif self.plot_list[plot_idx] == '2D Cartesian':
-            self.canvas2d_polar.setVisible(False)
-            self.canvas3d.setVisible(False)
-            self.canvas3d_array.setVisible(False)
-            self.canvas2d_cartesian.setVisible(True)
+            self.show_canvas('2D Cartesian')
 
             if self.fix_azimuth:
                 self.ui.rb_azimuth.setChecked(True)
@@ -521,8 +663,7 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
                 self.ui.rbhs_elevation.setEnabled(False)
                 self.nfft_az = 1
                 self.nfft_el = 4096
-                self.cartesianView.setLabel(
-                    axis='bottom', text='Elevation', units='°')
+                self.set_cut_axis('Elevation')
             else:
                 self.ui.rb_azimuth.setChecked(False)
                 self.ui.rb_azimuth.setEnabled(True)
@@ -534,18 +675,14 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
                 self.ui.rbhs_elevation.setEnabled(True)
                 self.nfft_az = 4096
                 self.nfft_el = 1
-                self.cartesianView.setLabel(
-                    axis='bottom', text='Azimuth', units='°')
+                self.set_cut_axis('Azimuth')
 
             self.ui.label_polarMinAmp.setVisible(False)
             self.ui.spinBox_polarMinAmp.setVisible(False)
             self.ui.horizontalSlider_polarMinAmp.setVisible(False)
             self.new_params()
         elif self.plot_list[plot_idx] == '2D Polar':
-            self.canvas2d_cartesian.setVisible(False)
-            self.canvas3d.setVisible(False)
-            self.canvas3d_array.setVisible(False)
-            self.canvas2d_polar.setVisible(True)
+            self.show_canvas('2D Polar')
 
             if self.fix_azimuth:
                 self.ui.rb_azimuth.setChecked(True)
@@ -575,10 +712,7 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
             self.ui.horizontalSlider_polarMinAmp.setVisible(True)
             self.new_params()
         elif self.plot_list[plot_idx] == 'Array layout':
-            self.canvas2d_cartesian.setVisible(False)
-            self.canvas2d_polar.setVisible(False)
-            self.canvas3d.setVisible(False)
-            self.canvas3d_array.setVisible(True)
+            self.show_canvas('Array layout')
 
             self.ui.rb_azimuth.setEnabled(False)
             self.ui.rbsb_azimuth.setEnabled(False)
@@ -592,21 +726,110 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
             self.ui.horizontalSlider_polarMinAmp.setVisible(False)
         self.new_params()
 
+    def get_export_weight(self, frame):
+        """Weights of the displayed array without the steering phase
+
+        Imported layouts are steered by the steering controls, so the
+        export leaves the steering out, see
+        :func:`arraylayout.unsteered_weight`.
+        """
+        return unsteered_weight(
+            frame['x'], frame['y'], frame['weight'],
+            self.frame_config.get('beam_az', 0),
+            self.frame_config.get('beam_el', 0))
+
+    def get_export_config(self, frame):
+        """x, y, amplitude and phase table of the displayed array"""
+        weight = self.get_export_weight(frame)
+        return np.column_stack((
+            frame['x'], frame['y'], np.abs(weight),
+            np.angle(weight) / np.pi * 180))
+
+    def write_pattern_csv(self, file_name, frame):
+        """Stream the azimuth, elevation, pattern table one azimuth at a time
+
+        The full table is never built, which keeps the export of a 512x512
+        pattern from allocating several MB on the GUI thread.
+        """
+        azimuth = frame['azimuth']
+        elevation = frame['elevation']
+        pattern = frame['pattern']
+        header = 'azimuth (degree), elevation (degree), pattern (dB)'
+        with open(file_name, 'w') as f:
+            for az_idx, az in enumerate(azimuth):
+                rows = np.column_stack((
+                    np.full(np.shape(elevation), az), elevation,
+                    pattern[az_idx]))
+                np.savetxt(f, rows, fmt='%1.8e', delimiter=',',
+                           header=header if az_idx == 0 else '')
+
+    def import_array_config(self):
+        fileName = QtWidgets.QFileDialog.getOpenFileName(
+            self, 'Import array config ...', '',
+            'Array config (*.csv *.npy *.npz);;All Files (*)')
+        if not fileName[0]:
+            return
+        # Load it here so a broken file is reported instead of stopping the
+        # worker, which then gets the cached layout
+        try:
+            get_layout(fileName[0])
+        except (OSError, ValueError, KeyError, IndexError) as error:
+            self.ui.statusBar().showMessage(
+                'Cannot import {}: {}'.format(fileName[0], error))
+            return
+        self.array_file = fileName[0]
+        self.set_custom_array(True)
+        self.new_params()
+
+    def clear_array_config(self):
+        self.array_file = None
+        self.set_custom_array(False)
+        self.new_params()
+
+    def set_custom_array(self, custom):
+        """Size, spacing and window do not apply to an imported layout"""
+        self.ui.gb_horizontal.setEnabled(not custom)
+        self.ui.gb_vertical.setEnabled(not custom)
+        self.ui.actionClear.setEnabled(custom)
+
     def export_array_config(self):
         fileName = QtWidgets.QFileDialog.getSaveFileName(
-            self, 'Export array config ...', 'array_config.csv',
-            'All Files (*);;CSV files (*.csv)')
-        if fileName[0]:
-            np.savetxt(fileName[0], self.exp_config, fmt='%1.8e', delimiter=',',
-                       header='x (wavelength), y (wavelength), amplitude (linear), phase (degree)')
+            self, 'Export array config ...', 'array_config.npz',
+            'NPZ files (*.npz);;NPY files (*.npy);;CSV files (*.csv);;'
+            'All Files (*)')
+        if not fileName[0]:
+            return
+        with self.calpattern.buffer.front() as (_, frame):
+            if fileName[0].lower().endswith('.csv'):
+                np.savetxt(fileName[0], self.get_export_config(frame), fmt='%1.8e', delimiter=',',
+                           header='x (wavelength), y (wavelength), amplitude (linear), phase (degree)')
+            elif fileName[0].lower().endswith('.npy'):
+                save_binary(fileName[0], frame['x'], frame['y'],
+                            self.get_export_weight(frame))
+            else:
+                np.savez(fileName[0], x=frame['x'], y=frame['y'],
+                         weight=self.get_export_weight(frame))
 
     def export_pattern(self):
         fileName = QtWidgets.QFileDialog.getSaveFileName(
-            self, 'Export pattern ...', 'pattern.csv',
-            'All Files (*);;CSV files (*.csv)')
-        if fileName[0]:
-            np.savetxt(fileName[0], self.exp_pattern, fmt='%1.8e', delimiter=',',
-                       header='azimuth (degree), elevation (degree), pattern (dB)')
+            self, 'Export pattern ...', 'pattern.npz',
+            'NPZ files (*.npz);;CSV files (*.csv);;All Files (*)')
+        if not fileName[0]:
+            return
+        with self.calpattern.buffer.front() as (_, frame):
+            if fileName[0].lower().endswith('.csv'):
+                self.write_pattern_csv(fileName[0], frame)
+            else:
+                save_npz(fileName[0], frame['azimuth'], frame['elevation'],
+                         frame['pattern'], self.frame_config)
+
+    def export_timing_log(self):
+        fileName = QtWidgets.QFileDialog.getSaveFileName(
+            self, 'Export timing log ...', 'timing_log.csv',
+            'CSV files (*.csv);;JSON lines (*.jsonl);;All Files (*)')
+        if not fileName[0]:
+            return
+        self.timing_log.export(fileName[0])
 
     def help(self):
         webbrowser.open(
@@ -628,13 +851,19 @@ class AntArrayAnalysis(QtWidgets.QMainWindow):
         retval = msg.exec_()
 
     @Slot()
-    def quit(_):
+    def quit(self):
+        self.calpattern.stop()
+        self.calpattern_thread.quit()
+        self.calpattern_thread.wait()
+        self.calpattern.buffer.close()
         sys.exit()
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     QtCore.QCoreApplication.setAttribute(QtCore.Qt.AA_ShareOpenGLContexts)
     app = QtWidgets.QApplication(sys.argv)
-    window = AntArrayAnalysis()
+    window = AntArrayAnalysis(engine_process='--process' in sys.argv,
+                              timing='--timing' in sys.argv)
     # window.show()
     sys.exit(app.exec())
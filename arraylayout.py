@@ -0,0 +1,280 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+from functools import lru_cache
+from itertools import islice
+import os
+import warnings
+import numpy as np
+from patternengine import (PatternEngine, PRECISION, fft_size, visible_bins,
+                           phase_ramp)
+from directpattern import steering_weight, get_pattern as direct_pattern
+from stagetiming import NULL_TIMER
+
+# Record of the binary layout file, one per element
+LAYOUT_DTYPE = np.dtype([('x', '<f8'), ('y', '<f8'), ('weight', '<c16')])
+
+# CSV rows parsed at once
+CHUNK_ROWS = 2 ** 16
+
+# Position tolerance in wavelengths for snapping a layout to a lattice,
+# 1e-4 is a phase error below 0.04 degree
+LATTICE_TOL = 1e-4
+
+# Largest lattice in elements the FFT path is used for
+MAX_LATTICE_ELEMENTS = 2 ** 24
+
+
+def read_csv(file_name, chunk_rows=CHUNK_ROWS):
+    """Positions and weights of a CSV layout, parsed in chunks
+
+    Reads the array config export of the GUI: rows of x, y (wavelengths),
+    amplitude (linear) and phase (degree). The weights default to 1 for
+    files with only x and y columns.
+
+    :return: x, y and complex weight arrays
+    """
+    chunks = []
+    with open(file_name, 'r') as f, warnings.catch_warnings():
+        # A chunk of only comments or blank lines is empty, not an error
+        warnings.simplefilter('ignore', UserWarning)
+        while 1:
+            lines = list(islice(f, chunk_rows))
+            if not lines:
+                break
+            chunk = np.loadtxt(lines, delimiter=',', ndmin=2)
+            if chunk.size:
+                chunks.append(chunk)
+    if not chunks:
+        raise ValueError('{} has no elements'.format(file_name))
+
+    table = np.concatenate(chunks)
+    if table.shape[1] < 4:
+        return table[:, 0], table[:, 1], np.ones(table.shape[0], complex)
+    return table[:, 0], table[:, 1], \
+        table[:, 2] * np.exp(1j * table[:, 3] / 180 * np.pi)
+
+
+def read_binary(file_name):
+    """Positions and weights of an NPY or NPZ layout
+
+    An NPY file holds ``LAYOUT_DTYPE`` records, or rows like the CSV
+    columns, and is memory-mapped so only the copy into the returned
+    arrays is read into memory. An NPZ file is the array config export of
+    the GUI with ``x``, ``y`` and ``weight`` arrays.
+
+    :return: x, y and complex weight arrays
+    """
+    if os.path.splitext(file_name)[1].lower() == '.npz':
+        with np.load(file_name) as data:
+            return data['x'], data['y'], data['weight']
+
+    table = np.load(file_name, mmap_mode='r')
+    if table.dtype.names:
+        return np.array(table['x'], dtype=float), \
+            np.array(table['y'], dtype=float), \
+            np.array(table['weight'], dtype=complex)
+    if table.shape[1] < 4:
+        return np.array(table[:, 0], dtype=float), \
+            np.array(table[:, 1], dtype=float), \
+            np.ones(table.shape[0], complex)
+    return np.array(table[:, 0], dtype=float), \
+        np.array(table[:, 1], dtype=float), \
+        table[:, 2] * np.exp(1j * np.asarray(table[:, 3]) / 180 * np.pi)
+
+
+def unsteered_weight(x, y, weight, beam_az=0, beam_el=0):
+    """Weights with the steering phase of ``beam_az``, ``beam_el`` removed
+
+    Inverse of :func:`directpattern.steering_weight`, which
+    :class:`ArrayLayout` applies to imported weights. Exporting the active
+    weights of a frame this way round trips: imported and steered to the
+    same beam they are the exported weights again, coupling included.
+    """
+    return steering_weight(x, y, weight, -beam_az, -beam_el)
+
+
+def save_binary(file_name, x, y, weight):
+    """Write a layout as an NPY file of ``LAYOUT_DTYPE`` records"""
+    table = np.empty(np.size(x), dtype=LAYOUT_DTYPE)
+    table['x'] = np.ravel(x)
+    table['y'] = np.ravel(y)
+    table['weight'] = np.ravel(weight)
+    np.save(file_name, table)
+
+
+def lattice_axis(position, tol=LATTICE_TOL):
+    """Spacing and integer index of positions on a regular grid
+
+    The positions must all be a whole number of spacings from the first
+    one. The smallest gap between distinct positions gives the index of
+    each position, and the spacing is then fitted to all of them, so
+    coordinates rounded in the file do not add up over a large aperture.
+
+    :return: spacing and index array, or None if the positions are not on
+        a grid
+    """
+    origin = np.min(position)
+    distinct = np.unique(np.round((position - origin) / tol)) * tol
+    if distinct.size == 1:
+        return 0.5, np.zeros(position.size, dtype=np.intp)
+    index = np.round((position - origin) / np.min(np.diff(distinct)))
+    spacing = np.dot(index, position - origin) / np.dot(index, index)
+    if np.max(np.abs(position - origin - index * spacing)) > tol:
+        return None
+    return spacing, index.astype(np.intp)
+
+
+class ArrayLayout:
+    """Array of elements at arbitrary positions with complex weights
+
+    Layouts whose elements sit on a regular grid, such as thinned,
+    triangular or irregularly bounded apertures, are placed on that grid
+    with zeros for the empty cells and go through
+    :meth:`patternengine.PatternEngine.weight_pattern`. Other layouts are
+    evaluated directly with :func:`directpattern.get_pattern` on the
+    angles the engine would use for a half wavelength grid.
+    """
+
+    def __init__(self, x, y, weight=None, tol=LATTICE_TOL,
+                 max_lattice_elements=MAX_LATTICE_ELEMENTS):
+        self.x = np.ascontiguousarray(x, dtype=float)
+        self.y = np.ascontiguousarray(y, dtype=float)
+        if weight is None:
+            weight = np.ones(self.x.size)
+        self.weight = np.ascontiguousarray(weight, dtype=complex)
+        self.gain = float(np.sum(np.abs(self.weight)))
+
+        # Distinct positions per axis, 1 for a linear array along the
+        # other axis
+        self.sizex = np.unique(self.x).size
+        self.sizey = np.unique(self.y).size
+
+        self.engine = None
+        axis_x = lattice_axis(self.x, tol)
+        axis_y = lattice_axis(self.y, tol)
+        if axis_x is not None and axis_y is not None:
+            (spacingx, ix), (spacingy, iy) = axis_x, axis_y
+            shape = (np.max(ix) + 1, np.max(iy) + 1)
+            if shape[0] * shape[1] <= max_lattice_elements:
+                self.engine = PatternEngine(
+                    shape[0], shape[1], spacingx, spacingy)
+                self.index = np.ravel_multi_index((ix, iy), shape)
+                self.shape = shape
+                # The engine puts the first lattice point at the origin
+                self.origin = (np.min(self.x), np.min(self.y))
+
+    def lattice_weight(self, weight, dtype):
+        """Weights on the lattice, summed where elements share a cell"""
+        size = self.shape[0] * self.shape[1]
+        grid = np.bincount(self.index, weight.real, size) + \
+            1j * np.bincount(self.index, weight.imag, size)
+        return grid.astype(dtype, copy=False).reshape(self.shape)
+
+    def angles(self, nfft, plot_angle):
+        if nfft == 1:
+            return np.array([plot_angle or 0.0])
+        return visible_bins(fft_size(nfft, 0.5), 0.5)[1]
+
+    def get_pattern(self, nfft_az=512, nfft_el=512, beam_az=0, beam_el=0,
+                    plot_az=None, plot_el=None, precision='double',
+                    element=None, timer=NULL_TIMER):
+        """Array factor over azimuth and elevation
+
+        Same arguments and output as
+        :meth:`patternengine.PatternEngine.get_pattern`, the weights of the
+        layout are steered to ``beam_az``, ``beam_el``.
+        """
+        real, complex_ = PRECISION[precision]
+        weight = steering_weight(self.x, self.y, self.weight, beam_az, beam_el)
+        timer.mark('weights')
+
+        if self.engine is not None:
+            AF_data = self.engine.weight_pattern(
+                self.lattice_weight(weight, complex_), nfft_az, nfft_el,
+                plot_az, plot_el, gain=self.gain)
+            AF = AF_data['array_factor']
+            azimuth = AF_data['azimuth']
+            elevation = AF_data['elevation']
+            AF *= phase_ramp(-self.origin[0] * np.sin(
+                azimuth / 180 * np.pi), complex_)[:, np.newaxis]
+            AF *= phase_ramp(-self.origin[1] * np.sin(
+                elevation / 180 * np.pi), complex_)[np.newaxis, :]
+        else:
+            azimuth = self.angles(nfft_az, plot_az)
+            elevation = self.angles(nfft_el, plot_el)
+            AF = direct_pattern(self.x, self.y, weight, azimuth, elevation)[
+                'array_factor'].astype(complex_, copy=False)
+        timer.mark('fft')
+
+        if element is not None:
+            AF *= element.sample(azimuth, elevation).astype(real)
+        timer.mark('pattern')
+        return {
+            'array_factor': AF,
+            'weight': weight,
+            'gain': self.gain,
+            'azimuth': azimuth,
+            'elevation': elevation
+        }
+
+
+def read_layout(file_name, chunk_rows=CHUNK_ROWS):
+    """Positions and weights of a CSV, NPY or NPZ layout file"""
+    if os.path.splitext(file_name)[1].lower() in ('.npy', '.npz'):
+        return read_binary(file_name)
+    return read_csv(file_name, chunk_rows)
+
+
+@lru_cache(maxsize=4)
+def cached_layout(file_name, mtime):
+    """Layout of a file, loaded once per modification time"""
+    return ArrayLayout(*read_layout(file_name))
+
+
+def get_layout(file_name=None):
+    """Imported layout for the engine, None for the rectangular array"""
+    if not file_name:
+        return None
+    file_name = os.path.abspath(file_name)
+    return cached_layout(file_name, os.path.getmtime(file_name))
@@ -0,0 +1,183 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+import argparse
+import json
+import sys
+import zipfile
+import numpy as np
+
+from patternengine import PatternEngine, WIN_TYPE, to_db
+from patternio import PatternWriter
+from elementpattern import get_element, coupling_coefficient
+
+
+def load_configs(file_name):
+    """Read array configs from a JSON list or a JSON Lines file
+
+    Each config uses the same keys as ``AntArrayAnalysis.new_params``
+    (``sizex``, ``spacingx``, ``beam_az``, ``windowx``, ``sllx``,
+    ``nfft_az``, ...). Windows can be given by index or by name.
+    """
+    with open(file_name, 'r') as f:
+        text = f.read().strip()
+    if text.startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def get_window_name(window):
+    if isinstance(window, str):
+        return window
+    return WIN_TYPE[window]
+
+
+def array_kwargs(config):
+    """Keyword arguments of ``PatternEngine.update_parameters`` for a
+    config
+    """
+    return {
+        'sizex': config.get('sizex', 64),
+        'sizey': config.get('sizey', 1),
+        'spacingx': config.get('spacingx', 0.5),
+        'spacingy': config.get('spacingy', 0.5)
+    }
+
+
+def pattern_kwargs(config):
+    """Keyword arguments of ``PatternEngine.get_pattern`` for a config
+
+    The one parser of configs, shared by the batch mode and the GUI worker.
+    """
+    return {
+        'nfft_az': config.get('nfft_az', 512),
+        'nfft_el': config.get('nfft_el', 512),
+        'beam_az': config.get('beam_az', 0),
+        'beam_el': config.get('beam_el', 0),
+        'windowx': get_window_name(config.get('windowx', 0)),
+        'sllx': config.get('sllx', -60),
+        'nbarx': config.get('nbarx', 20),
+        'windowy': get_window_name(config.get('windowy', 0)),
+        'slly': config.get('slly', -60),
+        'nbary': config.get('nbary', 20),
+        'plot_az': config.get('plot_az'),
+        'plot_el': config.get('plot_el'),
+        'precision': config.get('precision', 'double'),
+        'element': get_element(
+            config.get('element', 'Isotropic'), config.get('element_q', 1),
+            config.get('element_file')),
+        'couplingx': coupling_coefficient(
+            config.get('couplingx'), config.get('couplingx_phase', 0)),
+        'couplingy': coupling_coefficient(
+            config.get('couplingy'), config.get('couplingy_phase', 0))
+    }
+
+
+def compute_patterns(configs, engine=None, db=True):
+    """Yield ``(azimuth, elevation, pattern)`` for every config
+
+    The pattern is in dB as in the GUI, or the normalized complex array
+    factor with ``db=False``. One engine is shared across all configs so
+    repeated geometries hit its cache.
+    """
+    if engine is None:
+        engine = PatternEngine(64, 1)
+    for config in configs:
+        engine.update_parameters(**array_kwargs(config))
+        AF_data = engine.get_pattern(**pattern_kwargs(config))
+        yield (AF_data['azimuth'], AF_data['elevation'],
+               to_db(AF_data['array_factor']) if db
+               else AF_data['array_factor'])
+
+
+def save_patterns(file_name, configs, results):
+    """Write all patterns and their configs into one NPZ file
+
+    Entry ``i`` is stored as ``azimuth_i``, ``elevation_i`` and
+    ``pattern_i``, the configs as a JSON string under ``configs``. The
+    patterns are streamed into the file as they arrive, so only one is
+    held in memory.
+    """
+    with zipfile.ZipFile(file_name, 'w', allowZip64=True) as npz:
+        write_npz_entry(npz, 'configs', np.array(json.dumps(configs)))
+        for idx, (azimuth, elevation, pattern) in enumerate(results):
+            write_npz_entry(npz, 'azimuth_' + str(idx), azimuth)
+            write_npz_entry(npz, 'elevation_' + str(idx), elevation)
+            write_npz_entry(npz, 'pattern_' + str(idx), pattern)
+
+
+def write_npz_entry(npz, name, array):
+    """Add one array to an open NPZ file as ``np.savez`` does"""
+    with npz.open(name + '.npy', 'w', force_zip64=True) as f:
+        np.lib.format.write_array(f, np.asanyarray(array),
+                                  allow_pickle=False)
+
+
+def write_patterns(path, configs, results):
+    """Stream patterns into a :class:`patternio.PatternWriter` container"""
+    with PatternWriter(path) as writer:
+        for config, (azimuth, elevation, pattern) in zip(configs, results):
+            writer.append(azimuth, elevation, pattern, config)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Compute antenna array patterns without the GUI.')
+    parser.add_argument(
+        'configs', help='JSON or JSON Lines file with array configs')
+    parser.add_argument(
+        '-o', '--output', default='patterns.npz',
+        help='output NPZ file, or a pattern container directory for any '
+             'other name')
+    args = parser.parse_args(argv)
+
+    configs = load_configs(args.configs)
+    if args.output.endswith('.npz'):
+        save_patterns(args.output, configs, compute_patterns(configs))
+    else:
+        write_patterns(args.output, configs, compute_patterns(configs))
+    print('{} patterns written to {}'.format(len(configs), args.output))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,439 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+from calpattern import CalPattern
+from patternengine import WIN_TYPE, to_db
+from renderprep import prepare_render
+
+SIZES = [(1, 64), (64, 1), (16, 16), (64, 64), (128, 128), (256, 256)]
+NFFT = [512, 4096]
+
+# Plot modes of the GUI and the FFT sizes they request for a given nfft
+PLOTS = {
+    '3D (Az-El-Amp)': lambda nfft: (nfft, nfft),
+    '2D Cartesian': lambda nfft: (nfft, 1),
+    '2D Polar': lambda nfft: (nfft, 1),
+    'Array layout': lambda nfft: (nfft, 1)
+}
+
+# A stage regresses when it is slower than the baseline by more than the
+# threshold and by more than this many seconds, which keeps timer noise
+# of sub-millisecond stages out of the report
+MIN_DELTA = 0.0005
+
+# Modules the GUI loads on demand, reported if a cold start imports them
+LAZY_MODULES = ['scipy.fft', 'scipy.signal', 'scipy.interpolate',
+                'pyqtgraph.opengl', 'matplotlib']
+
+
+def case_key(size, nfft, window, plot):
+    return '{}x{}/nfft{}/{}/{}'.format(size[0], size[1], nfft, window, plot)
+
+
+def case_config(size, nfft, window, plot):
+    nfft_az, nfft_el = PLOTS[plot](nfft)
+    return {
+        'sizex': size[0],
+        'sizey': size[1],
+        'spacingx': 0.5,
+        'spacingy': 0.5,
+        'beam_az': 10.3,
+        'beam_el': 5.1,
+        'windowx': window,
+        'windowy': window,
+        'sllx': -40,
+        'slly': -40,
+        'nbarx': 4,
+        'nbary': 4,
+        'nfft_az': nfft_az,
+        'nfft_el': nfft_el,
+        'plot_az': 0,
+        'plot_el': 0
+    }
+
+
+class PipelineStages:
+    """The stages of ``CalPattern.compute_pattern``, callable one by one
+
+    Each steering update moves the beam slightly, so the steady state
+    stages measure a slider drag on a cached geometry.
+    """
+
+    def __init__(self, config, window=None):
+        self.calpattern = CalPattern()
+        self.calpattern.apply_config(config)
+        self.window = window
+        self.count = 0
+
+    def engine_cold(self):
+        self.calpattern.rect_array.cache.clear()
+        self.calpattern.rect_array.element_cache.clear()
+        return self.engine()
+
+    def engine(self):
+        cal = self.calpattern
+        self.count += 1
+        self.AF_data = cal.rect_array.get_pattern(
+            nfft_az=cal.nfft_az, nfft_el=cal.nfft_el,
+            beam_az=cal.beam_az + 0.01 * (self.count % 7),
+            beam_el=cal.beam_el,
+            windowx=cal.windowx, sllx=cal.sllx,
+            nbarx=cal.nbarx, windowy=cal.windowy,
+            slly=cal.slly, nbary=cal.nbary,
+            plot_az=cal.plot_az, plot_el=cal.plot_el,
+            precision=cal.precision)
+        return self.AF_data
+
+    def to_db(self):
+        array_factor = self.AF_data['array_factor']
+        self.AF = to_db(array_factor, out=self.calpattern.buffer.back(
+            'pattern', array_factor.shape))
+        return self.AF
+
+    def metrics(self):
+        return self.calpattern.get_metrics(self.AF_data, self.AF)
+
+    def render(self):
+        cal = self.calpattern
+        self.render_data = prepare_render(
+            self.AF_data['azimuth'], self.AF_data['elevation'], self.AF,
+            min_z=cal.min_z, max_z=cal.max_z,
+            colors_out=lambda shape: cal.buffer.back('colors', shape))
+        return self.render_data
+
+    def buffer(self):
+        cal = self.calpattern
+        render = self.render_data
+        cal.buffer.write({
+            'azimuth': self.AF_data['azimuth'],
+            'elevation': self.AF_data['elevation'],
+            'pattern': self.AF,
+            'x': cal.rect_array.x,
+            'y': cal.rect_array.y,
+            'weight': self.AF_data['weight'].ravel(),
+            'render_azimuth': render.get('azimuth', render.get('angle')),
+            'render_elevation': render.get('elevation'),
+            'render_pattern': render['pattern'],
+            'colors': render.get('colors')
+        })
+        cal.buffer.swap(self.count)
+
+    def total(self):
+        cal = self.calpattern
+        self.count += 1
+        cal.beam_az += 0.01 if self.count % 2 else -0.01
+        return cal.compute_pattern(cal.generation, cal.nfft_az, cal.nfft_el)
+
+    def gui(self):
+        with self.calpattern.buffer.front() as (_, frame):
+            self.window.plot_frame(frame)
+        self.window.app.processEvents()
+
+    def stages(self):
+        names = ['engine_cold', 'engine', 'to_db', 'metrics', 'render',
+                 'buffer', 'total']
+        if self.window is not None:
+            names.append('gui')
+        return names
+
+
+def measure(stage, repeat):
+    """Median and best wall time, peak and retained memory of a stage
+
+    Memory is traced in a separate run, as tracing slows the stage down.
+    ``allocations`` counts the memory blocks the stage leaves allocated.
+    """
+    stage()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stage()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    output = stage()
+    current, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocations = sum(max(stat.count_diff, 0)
+                      for stat in after.compare_to(before, 'lineno'))
+    del output
+
+    return {
+        'time': float(np.median(times)),
+        'time_min': float(np.min(times)),
+        'peak_memory': peak - start_memory,
+        'retained_memory': current - start_memory,
+        'allocations': allocations
+    }
+
+
+def run(sizes=SIZES, nffts=NFFT, windows=None, plots=None, repeat=5,
+        window=None, log=None):
+    """Benchmark every combination of the swept parameters
+
+    :param window: ``AntArrayAnalysis`` to time ``plot_frame`` with, None
+        to skip the GUI stage
+    :param log: file to print progress to
+    :return: dict of case key to a dict of stage results
+    """
+    windows = windows or list(WIN_TYPE.values())
+    plots = plots or list(PLOTS)
+    win_index = {name: idx for idx, name in WIN_TYPE.items()}
+    results = {}
+    for size in sizes:
+        for nfft in nffts:
+            for window_name in windows:
+                for plot in plots:
+                    key = case_key(size, nfft, window_name, plot)
+                    config = case_config(
+                        size, nfft, win_index[window_name], plot)
+                    if window is not None:
+                        window.plot_type_idx = window.plot_list.index(plot)
+                        window.show_canvas(plot)
+                    pipeline = PipelineStages(config, window)
+                    results[key] = {
+                        name: measure(getattr(pipeline, name), repeat)
+                        for name in pipeline.stages()}
+                    pipeline.calpattern.buffer.close()
+                    if log is not None:
+                        print('{:<48} {:8.2f} ms'.format(
+                            key, results[key]['total']['time'] * 1e3),
+                            file=log)
+    return results
+
+
+def compare(results, baseline, threshold=0.2):
+    """Stages slower or larger than the baseline by more than ``threshold``
+
+    :return: list of (case, stage, metric, baseline value, new value)
+    """
+    regressions = []
+    for key, stages in results.items():
+        for stage, result in stages.items():
+            base = baseline.get(key, {}).get(stage)
+            if base is None:
+                continue
+            if result['time'] > base['time'] * (1 + threshold) and \
+                    result['time'] - base['time'] > MIN_DELTA:
+                regressions.append(
+                    (key, stage, 'time', base['time'], result['time']))
+            if 'peak_memory' in result and result['peak_memory'] > \
+                    base['peak_memory'] * (1 + threshold) + 4096:
+                regressions.append(
+                    (key, stage, 'peak_memory', base['peak_memory'],
+                     result['peak_memory']))
+    return regressions
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor()
+    }
+
+
+def parse_sizes(text):
+    return [tuple(int(dim) for dim in size.split('x'))
+            for size in text.split(',')]
+
+
+def open_window():
+    """Offscreen ``AntArrayAnalysis`` for the GUI stage"""
+    from PySide6 import QtCore, QtWidgets
+    import arrayanalysis
+
+    QtCore.QCoreApplication.setAttribute(
+        QtCore.Qt.AA_ShareOpenGLContexts)
+    app = QtWidgets.QApplication.instance() or \
+        QtWidgets.QApplication(sys.argv[:1] + ['-platform', 'offscreen'])
+    window = arrayanalysis.AntArrayAnalysis()
+    window.app = app
+    return window
+
+
+def startup_run():
+    """Cold start of the GUI in this process
+
+    Prints the wall clock times at which the GUI modules were imported,
+    the window was built and the first frame was plotted as JSON.
+    """
+    from PySide6 import QtCore, QtWidgets
+    import arrayanalysis
+    imported = time.time()
+
+    QtCore.QCoreApplication.setAttribute(
+        QtCore.Qt.AA_ShareOpenGLContexts)
+    app = QtWidgets.QApplication(sys.argv[:1] + ['-platform', 'offscreen'])
+    window = arrayanalysis.AntArrayAnalysis()
+    shown = time.time()
+
+    # The first frame has been plotted once update_figure took its config
+    while not window.frame_config and time.time() - shown < 60:
+        app.processEvents()
+    plotted = time.time()
+
+    window.calpattern.stop()
+    window.calpattern_thread.quit()
+    window.calpattern_thread.wait()
+    print(json.dumps({
+        'imported': imported,
+        'shown': shown,
+        'plotted': plotted,
+        'loaded': [name for name in LAZY_MODULES if name in sys.modules]
+    }))
+
+
+def startup(repeat=5, log=None):
+    """Median cold start times over ``repeat`` new interpreters
+
+    Stages are timed from the end of the previous one: ``import`` from
+    launching the interpreter to the GUI modules imported, ``window`` to
+    the window built, ``first_frame`` to the first frame plotted, and
+    ``process`` is the whole run including the exit.
+
+    :return: dict of stage to a dict with its median ``time``
+    """
+    runs = []
+    for _ in range(repeat):
+        start = time.time()
+        output = subprocess.run(
+            [sys.executable, __file__, '--startup-run'], check=True,
+            capture_output=True, text=True).stdout
+        times = json.loads(output.strip().splitlines()[-1])
+        run = {
+            'import': times['imported'] - start,
+            'window': times['shown'] - times['imported'],
+            'first_frame': times['plotted'] - times['shown'],
+            'process': time.time() - start
+        }
+        runs.append(run)
+        if log is not None:
+            print('window after {:8.2f} ms, first frame after {:8.2f} ms, '
+                  'loaded {}'.format(
+                      (times['shown'] - start) * 1e3,
+                      (times['plotted'] - start) * 1e3,
+                      ', '.join(times['loaded']) or 'none'), file=log)
+    return {stage: {'time': float(np.median([run[stage] for run in runs]))}
+            for stage in ('import', 'window', 'first_frame', 'process')}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the pattern pipeline without the GUI.')
+    parser.add_argument(
+        '--sizes', type=parse_sizes, default=SIZES,
+        help='array sizes as sizex x sizey, e.g. 1x64,64x64')
+    parser.add_argument(
+        '--nfft', default=NFFT,
+        type=lambda text: [int(nfft) for nfft in text.split(',')],
+        help='comma separated nfft values')
+    parser.add_argument(
+        '--windows', type=lambda text: text.split(','),
+        help='comma separated windows, default all')
+    parser.add_argument(
+        '--plots', type=lambda text: text.split(','),
+        help='comma separated plot modes, default all')
+    parser.add_argument(
+        '--repeat', type=int, default=5, help='timed runs per stage')
+    parser.add_argument(
+        '--gui', action='store_true',
+        help='also time the plot update of an offscreen GUI')
+    parser.add_argument(
+        '--startup', action='store_true',
+        help='time cold starts of the GUI instead of the pipeline')
+    parser.add_argument(
+        '--startup-run', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('-o', '--output', help='write the results to JSON')
+    parser.add_argument('--baseline', help='baseline JSON to compare to')
+    parser.add_argument(
+        '--threshold', type=float, default=0.2,
+        help='allowed slowdown or memory growth, 0.2 is 20%%')
+    args = parser.parse_args(argv)
+
+    if args.startup_run:
+        startup_run()
+        return 0
+
+    window = open_window() if args.gui and not args.startup else None
+    if args.startup:
+        results = {'startup': startup(args.repeat, log=sys.stdout)}
+    else:
+        results = run(args.sizes, args.nfft, args.windows, args.plots,
+                      args.repeat, window, log=sys.stdout)
+    if window is not None:
+        window.calpattern.stop()
+        window.calpattern_thread.quit()
+        window.calpattern_thread.wait()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'results': results},
+                      f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for key, stage, metric, base, new in regressions:
+            print('REGRESSION {} {} {}: {:.4g} -> {:.4g}'.format(
+                key, stage, metric, base, new))
+        print('{} regressions'.format(len(regressions)))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -43,93 +43,395 @@
 
 from PySide6.QtCore import QObject, Signal, Slot
 import numpy as np
-from time import sleep
-import antarray.antarray as antarray
+import threading
+from patternengine import PatternEngine, to_db
+from batchpattern import array_kwargs, pattern_kwargs
+from arraylayout import get_layout
+from patternmetrics import (cut_metrics, directivity, linear_directivity,
+                            main_beam)
+from renderprep import prepare_render
+from synthesis import array_synthesis_steps
+from patternbuffer import PatternBuffer
+from stagetiming import StageTimer, NULL_TIMER, now
 
 
 class CalPattern(QObject):
-    patternReady = Signal(np.ndarray, np.ndarray,
-                          np.ndarray, np.ndarray, np.ndarray, np.ndarray)
-    new_data = False
+    patternReady = Signal(int, dict)
+    synthesisProgress = Signal(int, dict)
+    synthesisReady = Signal(int, dict)
+    engineFailed = Signal(int, str)
 
-    def __init__(self):
+    def __init__(self, buffer=None):
         super(CalPattern, self).__init__()
-        self.win_type = {
-            0: 'Square',
-            1: 'Chebyshev',
-            2: 'Taylor',
-            3: 'Hamming',
-            4: 'Hanning'
-        }
         self.sizex = 64
         self.sizey = 1
         self.spacingx = 0.5
         self.spacingy = 0.5
-        self.rect_array = antarray.RectArray(
+        self.rect_array = PatternEngine(
             self.sizex, self.sizey, self.spacingx, self.spacingy)
         self.beam_az = 0
         self.beam_el = 0
         self.u = np.linspace(-1, 1, num=101, endpoint=True)
         self.v = np.linspace(-1, 1, num=101, endpoint=True)
-        self.windowx = 0
-        self.windowy = 0
+        self.windowx = 'Square'
+        self.windowy = 'Square'
         self.sllx = 60
         self.slly = 60
         self.nbarx = 20
         self.nbary = 20
-        self.new_data = False
         self.plot = 'Cartesian'
+        self.precision = 'double'
+        self.element = None
+        self.couplingx = 0
+        self.couplingy = 0
 
-    def update_config(self, linear_array_config):
-        self.sizex = linear_array_config.get('sizex', 64)
-        self.sizey = linear_array_config.get('sizey', 32)
-        self.spacingx = linear_array_config['spacingx']
-        self.spacingy = linear_array_config.get('spacingy', 0.5)
-        self.beam_az = linear_array_config['beam_az']
-        self.beam_el = linear_array_config.get('beam_el', 0)
-        self.windowx = linear_array_config['windowx']
-        self.windowy = linear_array_config.get('windowy', 0)
-        self.sllx = linear_array_config['sllx']
-        self.slly = linear_array_config.get('slly', 60)
-        self.nbarx = linear_array_config['nbarx']
-        self.nbary = linear_array_config.get('nbary', 20)
-        self.nfft_az = linear_array_config.get('nfft_az')
-        self.nfft_el = linear_array_config.get('nfft_el')
-        self.plot_az = linear_array_config.get('plot_az')
-        self.plot_el = linear_array_config.get('plot_el')
-        self.new_data = True
+        # Imported layout replacing the rectangular array, see
+        # :mod:`arraylayout`
+        self.layout = None
+        self.layout_file = None
+
+        # Double buffer the GUI reads the latest frame from
+        self.buffer = PatternBuffer() if buffer is None else buffer
+
+        # Color scale of the 3D surface in dB
+        self.min_z = -100
+        self.max_z = 0
+
+        # Latest pending config, consumed by the worker loop. Only one slot
+        # is kept so a burst of updates collapses into the newest one.
+        self.pending_config = None
+        self.running = True
+        self.condition = threading.Condition()
+
+        # Progressive rendering of large patterns, coarse FFT size per axis
+        # and the idle time before refining to the full resolution
+        self.progressive = True
+        self.coarse_nfft = 128
+        self.refine_delay = 0.15
+
+        # Every request gets a new generation ID. Work tagged with an older
+        # generation is superseded and is dropped instead of emitted.
+        self.generation = 0
+
+        # Weight synthesis job, run one iteration at a time between pattern
+        # updates. A new request or a cancel replaces it.
+        self.synthesis = None
+        self.synthesis_id = 0
+
+        # Per-stage timing of each frame, sent along with its metrics when
+        # the config asks for it. Configs replaced before the worker picked
+        # them up are coalesced, jobs superseded while running are dropped.
+        self.timing = False
+        self.coalesced = 0
+        self.dropped = 0
+
+    def update_config(self, linear_array_config, generation=None):
+        with self.condition:
+            if generation is None:
+                self.generation += 1
+            else:
+                self.generation = generation
+            if self.pending_config is not None:
+                self.coalesced += 1
+            self.pending_config = dict(linear_array_config)
+            self.condition.notify()
+            return self.generation
+
+    def is_superseded(self, generation):
+        return generation != self.generation
+
+    def request_synthesis(self, params, job_id=None):
+        """Start a weight synthesis job, replacing a running one
+
+        :param dict params: arguments of
+            :func:`synthesis.array_synthesis_steps`, the geometry and the
+            beam default to the current config
+        :param int job_id: ID to use instead of the next one, for jobs
+            numbered by a :class:`processengine.ProcessCalPattern`
+        :return: ID of the job, used by ``synthesisProgress`` and
+            ``synthesisReady``
+        """
+        with self.condition:
+            self.synthesis_id = self.synthesis_id + 1 if job_id is None \
+                else job_id
+            self.synthesis = {
+                'id': self.synthesis_id,
+                'params': dict(params),
+                'steps': None
+            }
+            self.condition.notify()
+            return self.synthesis_id
+
+    def cancel_synthesis(self):
+        with self.condition:
+            self.synthesis = None
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def apply_config(self, linear_array_config):
+        """Take over a config, parsed as the batch configs by
+        :func:`batchpattern.array_kwargs` and
+        :func:`batchpattern.pattern_kwargs`
+        """
+        for key, value in array_kwargs(linear_array_config).items():
+            setattr(self, key, value)
+        for key, value in pattern_kwargs(linear_array_config).items():
+            setattr(self, key, value)
+        self.timing = linear_array_config.get('timing', False)
+        array_file = linear_array_config.get('array_file')
+        try:
+            self.layout = get_layout(array_file)
+        except OSError:
+            # Moved or deleted after the import, keep the layout already
+            # loaded from it. A file never loaded is still an error.
+            if array_file != self.layout_file:
+                raise
+        self.layout_file = array_file
         self.rect_array.update_parameters(
             sizex=self.sizex, sizey=self.sizey, spacingx=self.spacingx,
             spacingy=self.spacingy)
 
+    def get_metrics(self, AF_data, AF):
+        """Beam metrics of the computed pattern
+
+        Cut metrics are taken along the plotted cut, or along both
+        principal cuts through the main beam for the 3D pattern. The main
+        beam is the lobe at the steering angle, not a grating lobe that
+        happens to be higher. Directivity
+        is only available for the 3D pattern and for linear arrays of
+        isotropic elements cut along their axis. An element pattern is
+        taken to radiate only into the front hemisphere the 3D pattern
+        covers.
+        """
+        array = self if self.layout is None else self.layout
+        azimuth = AF_data['azimuth']
+        elevation = AF_data['elevation']
+        array_factor = AF_data['array_factor']
+        metrics = {'azimuth': None, 'elevation': None, 'directivity': np.nan}
+        if not np.any(array_factor):
+            # No element radiates, e.g. a 2-element Hann taper, so there
+            # is no beam to measure
+            return metrics
+
+        if self.nfft_el == 1:
+            metrics['azimuth'] = cut_metrics(
+                azimuth, AF[:, 0], beam=self.beam_az)
+            if array.sizey == 1 and self.element is None:
+                metrics['directivity'] = linear_directivity(
+                    azimuth, array_factor[:, 0])
+        elif self.nfft_az == 1:
+            metrics['elevation'] = cut_metrics(
+                elevation, AF[0, :], beam=self.beam_el)
+            if array.sizex == 1 and self.element is None:
+                metrics['directivity'] = linear_directivity(
+                    elevation, array_factor[0, :])
+        else:
+            peak_az, peak_el = main_beam(
+                azimuth, elevation, AF, self.beam_az, self.beam_el)
+            metrics['azimuth'] = cut_metrics(
+                azimuth, AF[:, peak_el], beam=azimuth[peak_az])
+            metrics['elevation'] = cut_metrics(
+                elevation, AF[peak_az, :], beam=elevation[peak_el])
+            metrics['directivity'] = directivity(
+                azimuth, elevation, array_factor,
+                back=self.element is None)
+        return metrics
+
+    def compute_pattern(self, generation, nfft_az, nfft_el):
+        """Compute the pattern of the applied config into the buffer
+
+        The dB pattern and the surface colors are written straight into
+        the back slot of ``self.buffer``, the remaining arrays are copied
+        there, and the slot is swapped to the front before the frame is
+        published.
+
+        :return: False if the job was superseded before it was published
+        """
+        timer = StageTimer() if self.timing else NULL_TIMER
+        if self.layout is None:
+            array = self.rect_array
+            AF_data = self.rect_array.get_pattern(
+                nfft_az=nfft_az,
+                nfft_el=nfft_el,
+                beam_az=self.beam_az,
+                beam_el=self.beam_el,
+                windowx=self.windowx,
+                sllx=self.sllx,
+                nbarx=self.nbarx,
+                windowy=self.windowy,
+                slly=self.slly,
+                nbary=self.nbary,
+                plot_az=self.plot_az,
+                plot_el=self.plot_el,
+                precision=self.precision,
+                element=self.element,
+                couplingx=self.couplingx,
+                couplingy=self.couplingy,
+                timer=timer
+            )
+        else:
+            # The weights of an imported layout replace the windows, and
+            # the per-axis coupling model does not apply to it
+            array = self.layout
+            AF_data = self.layout.get_pattern(
+                nfft_az=nfft_az,
+                nfft_el=nfft_el,
+                beam_az=self.beam_az,
+                beam_el=self.beam_el,
+                plot_az=self.plot_az,
+                plot_el=self.plot_el,
+                precision=self.precision,
+                element=self.element,
+                timer=timer
+            )
+
+        if self.is_superseded(generation):
+            self.dropped += 1
+            return False
+
+        AF = to_db(AF_data['array_factor'], out=self.buffer.back(
+            'pattern', AF_data['array_factor'].shape))
+        timer.mark('to_db')
+        metrics = self.get_metrics(AF_data, AF)
+        timer.mark('metrics')
+        render = prepare_render(
+            AF_data['azimuth'], AF_data['elevation'], AF,
+            min_z=self.min_z, max_z=self.max_z,
+            colors_out=lambda shape: self.buffer.back('colors', shape))
+        timer.mark('render')
+
+        self.buffer.write({
+            'azimuth': AF_data['azimuth'],
+            'elevation': AF_data['elevation'],
+            'pattern': AF,
+            'x': array.x,
+            'y': array.y,
+            'weight': AF_data['weight'].ravel(),
+            'render_azimuth': render.get('azimuth', render.get('angle')),
+            'render_elevation': render.get('elevation'),
+            'render_pattern': render['pattern'],
+            'colors': render.get('colors')
+        })
+
+        if self.is_superseded(generation):
+            self.dropped += 1
+            return False
+
+        self.buffer.swap(generation)
+        timer.mark('buffer')
+        if self.timing:
+            metrics['timing'] = {
+                'stages': timer.stages,
+                'published': now(),
+                'nfft_az': nfft_az,
+                'nfft_el': nfft_el,
+                'coalesced': self.coalesced,
+                'dropped': self.dropped
+            }
+        self.publish(generation, metrics)
+        return True
+
+    def publish(self, generation, metrics):
+        self.patternReady.emit(generation, metrics)
+
+    def fail(self, generation, message):
+        self.engineFailed.emit(generation, message)
+
+    def publish_progress(self, job_id, progress):
+        self.synthesisProgress.emit(job_id, progress)
+
+    def publish_synthesis(self, job_id, result):
+        self.synthesisReady.emit(job_id, result)
+
+    def wait_idle(self):
+        """Wait up to ``refine_delay`` for a new job
+
+        :return: True if no new job arrived and the worker is still running
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.pending_config is not None or not self.running,
+                timeout=self.refine_delay)
+            return self.pending_config is None and self.running
+
+    def step_synthesis(self, job):
+        """Run one iteration of a synthesis job and report it"""
+        if job['steps'] is None:
+            params = {
+                'sizex': self.sizex,
+                'sizey': self.sizey,
+                'spacingx': self.spacingx,
+                'spacingy': self.spacingy,
+                'beam_az': self.beam_az,
+                'beam_el': self.beam_el
+            }
+            params.update(job['params'])
+            job['steps'] = array_synthesis_steps(**params)
+
+        try:
+            progress = next(job['steps'])
+        except StopIteration as done:
+            with self.condition:
+                if self.synthesis is not job:
+                    return
+                self.synthesis = None
+            self.publish_synthesis(job['id'], done.value)
+            return
+
+        if self.synthesis is job:
+            self.publish_progress(job['id'], progress)
+
+    def run_config(self, config, generation):
+        self.apply_config(config)
+        if self.is_superseded(generation):
+            self.dropped += 1
+            return
+
+        # Large patterns are shown coarse first and refined to the full
+        # resolution once the input has been idle for refine_delay. Both
+        # passes share the cached taper of the geometry.
+        if self.progressive and \
+                self.nfft_az * self.nfft_el > self.coarse_nfft ** 2:
+            if not self.compute_pattern(
+                    generation, min(self.nfft_az, self.coarse_nfft),
+                    min(self.nfft_el, self.coarse_nfft)):
+                return
+            if not self.wait_idle():
+                return
+
+        self.compute_pattern(generation, self.nfft_az, self.nfft_el)
+
     @Slot()
     def cal_pattern(self):
         while 1:
-            if self.new_data:
-                self.new_data = False
-
-                AF_data = self.rect_array.get_pattern(
-                    nfft_az=self.nfft_az,
-                    nfft_el=self.nfft_el,
-                    beam_az=self.beam_az,
-                    beam_el=self.beam_el,
-                    windowx=self.win_type[self.windowx],
-                    sllx=self.sllx,
-                    nbarx=self.nbarx,
-                    windowy=self.win_type[self.windowy],
-                    slly=self.slly,
-                    nbary=self.nbary,
-                    plot_az=self.plot_az,
-                    plot_el=self.plot_el
-                )
-
-                AF = 20 * np.log10(np.abs(AF_data['array_factor']) + 0.00001)
-
-                x = self.rect_array.x
-                y = self.rect_array.y
-                weight = AF_data['weight'].ravel()
-
-                self.patternReady.emit(
-                    AF_data['azimuth'], AF_data['elevation'], AF, x, y, weight)
-
-            sleep(0.01)
+            with self.condition:
+                while self.pending_config is None and \
+                        self.synthesis is None and self.running:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                config = self.pending_config
+                generation = self.generation
+                self.pending_config = None
+                job = self.synthesis
+
+            # Pattern updates go first so a synthesis does not stall the
+            # interactive view
+            try:
+                if config is not None:
+                    self.run_config(config, generation)
+                else:
+                    self.step_synthesis(job)
+            except Exception as error:
+                # Only the failing job is lost, the worker keeps serving
+                # new configs
+                if config is None:
+                    with self.condition:
+                        if self.synthesis is job:
+                            self.synthesis = None
+                self.fail(generation, '{} failed: {}: {}'.format(
+                    'Pattern' if config is not None else 'Synthesis',
+                    type(error).__name__, error))
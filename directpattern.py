@@ -0,0 +1,219 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+import numpy as np
+
+# Complex phase terms kept in memory at once, 2**22 is 64 MB of complex128
+MAX_CHUNK_ELEMENTS = 2 ** 22
+
+
+def steering_weight(x, y, taper, beam_az=0, beam_el=0, z=None):
+    """Steered complex weights of an arbitrary layout
+
+    :param x: element x positions in wavelengths
+    :param y: element y positions in wavelengths
+    :param taper: element amplitudes, or complex weights
+    :param z: optional element z positions in wavelengths
+    """
+    u, v, w = direction_cosines(beam_az, beam_el)
+    phase = np.asarray(x) * u + np.asarray(y) * v
+    if z is not None:
+        phase = phase + np.asarray(z) * w
+    return taper * np.exp(1j * 2 * np.pi * phase)
+
+
+def direction_cosines(azimuth, elevation):
+    """Direction cosines with the ``u = sin(az)``, ``v = sin(el)`` convention
+    of :class:`patternengine.PatternEngine`, ``w`` is 0 outside the visible
+    region
+    """
+    u = np.sin(np.asarray(azimuth, dtype=float) / 180 * np.pi)
+    v = np.sin(np.asarray(elevation, dtype=float) / 180 * np.pi)
+    w = np.sqrt(np.maximum(1 - u ** 2 - v ** 2, 0))
+    return u, v, w
+
+
+def array_factor(x, y, weight, azimuth, elevation, z=None, chunk_size=None):
+    """Array factor evaluated directly at the given directions
+
+    ``azimuth`` and ``elevation`` are broadcast against each other and the
+    result has their broadcast shape. The directions are processed in
+    chunks so that at most ``chunk_size`` x N phase terms are in memory.
+
+    :param x: element x positions in wavelengths
+    :param y: element y positions in wavelengths
+    :param weight: complex element weights, steering included
+    :param z: optional element z positions for conformal layouts
+    :param int chunk_size: directions per chunk, defaults to
+        ``MAX_CHUNK_ELEMENTS // N``
+    """
+    x = np.ravel(x)
+    y = np.ravel(y)
+    weight = np.ravel(weight)
+    z = None if z is None else np.ravel(z)
+    azimuth, elevation = np.broadcast_arrays(azimuth, elevation)
+    u, v, w = direction_cosines(azimuth.ravel(), elevation.ravel())
+
+    if chunk_size is None:
+        chunk_size = max(MAX_CHUNK_ELEMENTS // max(x.size, 1), 1)
+
+    AF = np.empty(u.size, dtype=complex)
+    for start in range(0, u.size, chunk_size):
+        stop = start + chunk_size
+        phase = np.multiply.outer(u[start:stop], x) + \
+            np.multiply.outer(v[start:stop], y)
+        if z is not None:
+            phase += np.multiply.outer(w[start:stop], z)
+        AF[start:stop] = np.exp(-1j * 2 * np.pi * phase).dot(weight)
+    return AF.reshape(azimuth.shape)
+
+
+def uniform(sine):
+    """True for more than two equally spaced sines, like the FFT bins of
+    :class:`patternengine.PatternEngine`
+    """
+    if sine.size < 3:
+        return False
+    step = np.diff(sine)
+    return np.max(np.abs(step - step[0])) < 1e-12
+
+
+def phase_terms(sine, position):
+    """``exp(-j 2 pi sine position)`` for every sine and position
+
+    Uniformly spaced sines are built with a running product along the
+    sines, a complex multiply instead of an exponential per term.
+    """
+    if uniform(sine):
+        step = sine[1] - sine[0]
+        terms = np.empty((sine.size, position.size), dtype=complex)
+        terms[0] = np.exp(-1j * 2 * np.pi * sine[0] * position)
+        terms[1:] = np.exp(-1j * 2 * np.pi * step * position)
+        return np.cumprod(terms, axis=0, out=terms)
+    return np.exp(-1j * 2 * np.pi * np.multiply.outer(sine, position))
+
+
+def uniform_sum(sine, position, weight):
+    """``sum(weight * exp(-j 2 pi sine position))`` for uniformly spaced sines
+
+    Every sine steps the terms of the previous one by a fixed phase per
+    element, so no sine x element phase matrix is built.
+    """
+    term = weight * np.exp(-1j * 2 * np.pi * sine[0] * position)
+    step = np.exp(-1j * 2 * np.pi * (sine[1] - sine[0]) * position)
+    AF = np.empty(sine.size, dtype=complex)
+    for idx in range(sine.size):
+        AF[idx] = np.sum(term)
+        term *= step
+    return AF
+
+
+def grid_array_factor(x, y, weight, azimuth, elevation, chunk_size=None):
+    """Array factor of a planar layout on an azimuth x elevation grid
+
+    The phase of a planar element splits into an azimuth and an elevation
+    term, so the grid is the product of an (azimuth x N) and an
+    (N x elevation) phase matrix. That costs N x (n_az + n_el) phase terms
+    and one matrix product instead of a phase term per element and
+    direction, see :func:`phase_terms` for uniformly spaced sines.
+    Elements are processed in chunks so that at most about
+    ``MAX_CHUNK_ELEMENTS`` phase terms are in memory.
+
+    :param azimuth: 1-D azimuth angles in degrees
+    :param elevation: 1-D elevation angles in degrees
+    :param int chunk_size: elements per chunk
+    """
+    x = np.ravel(x)
+    y = np.ravel(y)
+    weight = np.ravel(weight)
+    u = np.sin(np.asarray(azimuth, dtype=float) / 180 * np.pi)
+    v = np.sin(np.asarray(elevation, dtype=float) / 180 * np.pi)
+
+    # A cut along uniformly spaced sines is a running sum per angle
+    if v.size == 1 and uniform(u):
+        return uniform_sum(
+            u, x, weight * np.exp(-1j * 2 * np.pi * v[0] * y))[:, np.newaxis]
+    if u.size == 1 and uniform(v):
+        return uniform_sum(
+            v, y, weight * np.exp(-1j * 2 * np.pi * u[0] * x))[np.newaxis, :]
+
+    if chunk_size is None:
+        chunk_size = max(MAX_CHUNK_ELEMENTS // max(u.size, v.size, 1), 1)
+
+    AF = np.zeros((u.size, v.size), dtype=complex)
+    for start in range(0, x.size, chunk_size):
+        stop = start + chunk_size
+        phase_x = phase_terms(u, x[start:stop])
+        phase_x *= weight[start:stop]
+        AF += phase_x @ phase_terms(v, y[start:stop]).T
+    return AF
+
+
+def get_pattern(x, y, weight, azimuth, elevation, z=None, chunk_size=None):
+    """Normalized array factor on an azimuth x elevation grid
+
+    Same output as :meth:`patternengine.PatternEngine.get_pattern`, but at
+    the caller's angles and for any element layout, e.g. a few hundred
+    points around the main beam instead of a 4096-point FFT.
+
+    Planar layouts use :func:`grid_array_factor`, ``chunk_size`` is then
+    in elements instead of directions.
+
+    :param azimuth: 1-D azimuth angles in degrees
+    :param elevation: 1-D elevation angles in degrees
+    """
+    azimuth = np.atleast_1d(np.asarray(azimuth, dtype=float))
+    elevation = np.atleast_1d(np.asarray(elevation, dtype=float))
+    if z is None:
+        AF = grid_array_factor(x, y, weight, azimuth, elevation,
+                               chunk_size=chunk_size)
+    else:
+        AF = array_factor(x, y, weight, azimuth[:, np.newaxis],
+                          elevation[np.newaxis, :], z=z,
+                          chunk_size=chunk_size)
+    return {
+        'array_factor': AF / np.sum(np.abs(weight)),
+        'weight': weight,
+        'azimuth': azimuth,
+        'elevation': elevation
+    }
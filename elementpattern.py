@@ -0,0 +1,171 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+from functools import lru_cache
+import os
+import numpy as np
+
+ELEMENT_TYPE = ['Isotropic', 'Cosine', 'Tabulated']
+
+# Level of a tabulated pattern outside of its table in dB
+FLOOR = -100
+
+
+class CosineElement:
+    """``cos(theta)^q`` field pattern, theta off the array broadside
+
+    Uses the direction cosines of :mod:`patternengine`, ``u = sin(az)`` and
+    ``v = sin(el)``, so ``cos(theta) = sqrt(1 - u^2 - v^2)`` and the
+    pattern is zero outside the visible region.
+    """
+
+    def __init__(self, q=1):
+        self.q = float(q)
+        self.key = ('Cosine', self.q)
+
+    def sample(self, azimuth, elevation):
+        """Amplitude on the azimuth x elevation grid in degrees"""
+        u = np.sin(np.asarray(azimuth) / 180 * np.pi)[:, np.newaxis]
+        v = np.sin(np.asarray(elevation) / 180 * np.pi)[np.newaxis, :]
+        cos_theta = np.sqrt(np.clip(1 - u ** 2 - v ** 2, 0, None))
+        return cos_theta ** self.q
+
+
+class TabulatedElement:
+    """Measured amplitude pattern on an azimuth x elevation table
+
+    The table is interpolated linearly in dB and normalized to a 0 dB
+    peak. A table with a single azimuth or elevation is a cut, and is
+    used for every angle along that axis.
+    """
+
+    def __init__(self, azimuth, elevation, pattern, key=None):
+        self.azimuth = np.atleast_1d(np.asarray(azimuth, dtype=float))
+        self.elevation = np.atleast_1d(np.asarray(elevation, dtype=float))
+        pattern = np.asarray(pattern, dtype=float).reshape(
+            self.azimuth.size, self.elevation.size)
+        self.pattern = pattern - np.max(pattern)
+        self.key = key or ('Tabulated', id(self))
+
+    def sample(self, azimuth, elevation):
+        """Amplitude on the azimuth x elevation grid in degrees"""
+        azimuth = np.atleast_1d(np.asarray(azimuth, dtype=float))
+        elevation = np.atleast_1d(np.asarray(elevation, dtype=float))
+        axes = [(self.azimuth, azimuth), (self.elevation, elevation)]
+        points = [table for table, _ in axes if table.size > 1]
+        pattern = self.pattern.reshape(
+            [table.size for table in points] or [1])
+
+        if points:
+            from scipy.interpolate import RegularGridInterpolator
+
+            interpolator = RegularGridInterpolator(
+                points, pattern, bounds_error=False, fill_value=FLOOR)
+            grid = np.meshgrid(*[angle for table, angle in axes
+                                 if table.size > 1], indexing='ij')
+            pattern_db = interpolator(np.stack(grid, axis=-1))
+        else:
+            pattern_db = pattern
+
+        # Broadcast a cut along the axis it does not cover
+        shape = [angle.size if table.size > 1 else 1
+                 for table, angle in axes]
+        pattern_db = np.broadcast_to(
+            np.reshape(pattern_db, shape), (azimuth.size, elevation.size))
+        return 10 ** (pattern_db / 20)
+
+
+def load_table(file_name):
+    """Azimuth, elevation and dB pattern of a CSV or NPZ pattern file
+
+    Reads the pattern exports of the GUI: a CSV file of azimuth,
+    elevation, pattern (dB) rows covering a full grid, or an NPZ file with
+    ``azimuth``, ``elevation`` and ``pattern`` arrays.
+    """
+    if os.path.splitext(file_name)[1].lower() == '.npz':
+        with np.load(file_name) as data:
+            return data['azimuth'], data['elevation'], data['pattern']
+
+    table = np.atleast_2d(np.loadtxt(file_name, delimiter=',', comments='#'))
+    azimuth = np.unique(table[:, 0])
+    elevation = np.unique(table[:, 1])
+    if table.shape[0] != azimuth.size * elevation.size:
+        raise ValueError(
+            '{} is not a full azimuth x elevation grid'.format(file_name))
+    order = np.lexsort((table[:, 1], table[:, 0]))
+    return azimuth, elevation, table[order, 2].reshape(
+        azimuth.size, elevation.size)
+
+
+@lru_cache(maxsize=8)
+def cached_element(file_name, mtime):
+    """Tabulated element of a file, loaded once per modification time"""
+    azimuth, elevation, pattern = load_table(file_name)
+    return TabulatedElement(
+        azimuth, elevation, pattern, key=('Tabulated', file_name, mtime))
+
+
+def get_element(element='Isotropic', q=1, file_name=None):
+    """Element pattern for the engine, None for an isotropic element
+
+    :param str element: 'Isotropic', 'Cosine' or 'Tabulated'
+    :param float q: exponent of the cosine pattern
+    :param str file_name: pattern file of a tabulated element, see
+        :func:`load_table`
+    """
+    if element == 'Cosine':
+        return CosineElement(q)
+    elif element == 'Tabulated':
+        file_name = os.path.abspath(file_name)
+        return cached_element(file_name, os.path.getmtime(file_name))
+    return None
+
+
+def coupling_coefficient(level=None, phase=0):
+    """Complex coupling to the nearest neighbour
+
+    :param float level: coupling in dB, None for no coupling
+    :param float phase: coupling phase in degrees
+    """
+    if level is None:
+        return 0
+    return 10 ** (level / 20) * np.exp(1j * phase / 180 * np.pi)
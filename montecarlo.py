@@ -0,0 +1,224 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+import numpy as np
+
+from patternengine import fft_size, to_db
+from patternmetrics import cut_metrics, main_beam
+
+METRICS = ('peak', 'peak_angle', 'hpbw', 'sll')
+
+
+def quantize_phase(weight, bits):
+    """Weights with their phases rounded to ``bits``-bit phase shifters"""
+    step = 2 * np.pi / 2 ** bits
+    phase = np.round(np.angle(weight) / step) * step
+    return (np.abs(weight) * np.exp(1j * phase)).astype(weight.dtype)
+
+
+def error_weights(weight, count, rng, amplitude_error=0, phase_error=0,
+                  phase_bits=None, failure_rate=0):
+    """``count`` random realizations of the element weights
+
+    :param weight: (sizex, sizey) nominal complex weights
+    :param rng: ``numpy.random.Generator``, or a tuple of three for the
+        amplitude, phase and failure draws
+    :param float amplitude_error: standard deviation of the amplitude
+        error in dB
+    :param float phase_error: standard deviation of the phase error in
+        degrees
+    :param int phase_bits: resolution of the phase shifters, None for
+        continuous phase
+    :param float failure_rate: probability that an element is off
+    :return: (count, sizex, sizey) weights
+    """
+    if phase_bits:
+        weight = quantize_phase(weight, phase_bits)
+    rng_amplitude, rng_phase, rng_failure = \
+        rng if isinstance(rng, tuple) else (rng,) * 3
+    shape = (count,) + weight.shape
+    error = np.ones(shape, dtype=weight.dtype)
+    if amplitude_error:
+        error *= 10 ** (rng_amplitude.normal(0, amplitude_error, shape) / 20)
+    if phase_error:
+        error *= np.exp(1j * rng_phase.normal(
+            0, phase_error / 180 * np.pi, shape))
+    if failure_rate:
+        error *= rng_failure.random(shape) >= failure_rate
+    error *= weight
+    return error
+
+
+def pattern_batches(engine, count=1000, batch_size=None, seed=None,
+                    nfft_az=512, nfft_el=1, plot_az=None, plot_el=None,
+                    amplitude_error=0, phase_error=0, phase_bits=None,
+                    failure_rate=0, **pattern_kwargs):
+    """Yield the patterns of random weight errors in batches
+
+    The nominal weights come from ``engine.get_pattern`` with
+    ``pattern_kwargs``, the errors are applied to them and every batch is
+    transformed at once with ``engine.weight_pattern``. Patterns are
+    normalized to the nominal gain, so a loss of gain lowers the peak.
+
+    :param int batch_size: realizations per batch, by default as many as
+        fit in ``engine.max_fft_elements``
+    :param seed: seed of the random generators, the realizations do not
+        depend on the batch size
+    :return: generator of dicts with the nominal pattern ``AF_data`` and
+        the ``pattern`` of the batch in dB, (n, n_az, n_el)
+    """
+    AF_data = engine.get_pattern(
+        nfft_az=nfft_az, nfft_el=nfft_el, plot_az=plot_az, plot_el=plot_el,
+        **pattern_kwargs)
+    element = pattern_kwargs.get('element')
+    if element is not None:
+        element = element.sample(AF_data['azimuth'], AF_data['elevation'])
+
+    if batch_size is None:
+        grid = fft_size(nfft_az, engine.spacingx) * \
+            fft_size(nfft_el, engine.spacingy)
+        batch_size = engine.max_fft_elements // max(
+            grid, AF_data['weight'].size)
+    batch_size = max(int(batch_size), 1)
+
+    # One stream per error type, so the draws of a realization do not
+    # depend on how the realizations are split into batches
+    rng = tuple(np.random.default_rng(seed).spawn(3))
+    for start in range(0, count, batch_size):
+        weight = error_weights(
+            AF_data['weight'], min(batch_size, count - start), rng,
+            amplitude_error=amplitude_error, phase_error=phase_error,
+            phase_bits=phase_bits, failure_rate=failure_rate)
+        AF = engine.weight_pattern(
+            weight, nfft_az=nfft_az, nfft_el=nfft_el, plot_az=plot_az,
+            plot_el=plot_el, gain=AF_data['gain'])['array_factor']
+        if element is not None:
+            AF *= element
+        yield {
+            'AF_data': AF_data,
+            'start': start,
+            'pattern': to_db(AF, out=np.empty(AF.shape, AF.real.dtype))
+        }
+
+
+def batch_metrics(azimuth, elevation, pattern, peak_az, peak_el):
+    """Cut metrics of a batch, along the cut or through the nominal peak
+
+    The main beam of every realization is the lobe at the nominal peak.
+    """
+    metrics = {}
+    if azimuth.size > 1:
+        metrics['azimuth'] = cut_metrics(
+            azimuth, pattern[:, :, peak_el], beam=azimuth[peak_az])
+    if elevation.size > 1:
+        metrics['elevation'] = cut_metrics(
+            elevation, pattern[:, peak_az, :], beam=elevation[peak_el])
+    return metrics
+
+
+def monte_carlo(engine, count=1000, percentiles=(5, 50, 95), envelopes=None,
+                **kwargs):
+    """Pattern statistics over ``count`` realizations of weight errors
+
+    The realizations are computed and reduced batch by batch, see
+    :func:`pattern_batches` for the error and pattern arguments.
+
+    :param envelopes: compute the percentile envelopes. They keep every
+        pattern, count * n_az * n_el float32, so by default they are only
+        computed for cuts. A 513x513 2D run would need about 1 GB for
+        1000 realizations.
+    :return: dict with the ``azimuth`` and ``elevation`` axes, the
+        ``nominal`` pattern, the ``mean`` pattern (mean power) and the
+        ``envelopes`` (len(percentiles), n_az, n_el) in dB or None, the per
+        realization cut ``metrics`` keyed by cut axis and metric, and
+        their ``statistics`` (mean, std and percentiles)
+    """
+    power = None
+    patterns = None
+    metrics = {}
+    for batch in pattern_batches(engine, count=count, **kwargs):
+        AF_data = batch['AF_data']
+        pattern = batch['pattern']
+        start = batch['start']
+        if power is None:
+            nominal = to_db(AF_data['array_factor'])
+            peak_az, peak_el = main_beam(
+                AF_data['azimuth'], AF_data['elevation'], nominal,
+                kwargs.get('beam_az', 0), kwargs.get('beam_el', 0))
+            power = np.zeros(pattern.shape[1:])
+            if envelopes is None:
+                envelopes = 1 in pattern.shape[1:]
+            if envelopes and percentiles:
+                patterns = np.empty(
+                    (count,) + pattern.shape[1:], dtype=np.float32)
+
+        power += np.sum(10 ** (pattern / 10), axis=0)
+        if patterns is not None:
+            patterns[start:start + pattern.shape[0]] = pattern
+
+        cut = batch_metrics(AF_data['azimuth'], AF_data['elevation'],
+                            pattern, peak_az, peak_el)
+        for axis, values in cut.items():
+            for name in METRICS:
+                metrics.setdefault(axis, {}).setdefault(
+                    name, np.empty(count))[
+                    start:start + pattern.shape[0]] = values[name]
+
+    statistics = {
+        axis: {name: {
+            'mean': np.nanmean(values),
+            'std': np.nanstd(values),
+            'percentiles': np.nanpercentile(values, percentiles)
+            if percentiles else np.array([])}
+            for name, values in axis_metrics.items()}
+        for axis, axis_metrics in metrics.items()}
+
+    return {
+        'azimuth': AF_data['azimuth'],
+        'elevation': AF_data['elevation'],
+        'nominal': nominal,
+        'mean': 10 * np.log10(power / count),
+        'envelopes': np.percentile(patterns, percentiles, axis=0)
+        if patterns is not None else None,
+        'metrics': metrics,
+        'statistics': statistics
+    }
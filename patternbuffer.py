@@ -0,0 +1,322 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+import sys
+import threading
+from multiprocessing import shared_memory
+import numpy as np
+
+# Buffer fields and their dtypes, one set per slot. For a cut,
+# render_azimuth holds the cut angle and render_elevation and colors are
+# empty.
+FIELDS = (
+    ('azimuth', np.float64),
+    ('elevation', np.float64),
+    ('pattern', np.float64),
+    ('x', np.float64),
+    ('y', np.float64),
+    ('weight', np.complex128),
+    ('render_azimuth', np.float64),
+    ('render_elevation', np.float64),
+    ('render_pattern', np.float64),
+    ('colors', np.uint8)
+)
+
+# Default capacities in elements, enough for a 1025x1025 pattern and a
+# 256x256 array; larger frames grow the buffer
+CAPACITY = {
+    'azimuth': 16385,
+    'elevation': 16385,
+    'pattern': 1025 * 1025,
+    'x': 256 * 256,
+    'y': 256 * 256,
+    'weight': 256 * 256,
+    'render_azimuth': 16385,
+    'render_elevation': 16385,
+    'render_pattern': 1025 * 1025,
+    'colors': 1025 * 1025 * 4
+}
+
+MAX_DIMS = 3
+ALIGN = 64
+
+
+class PatternBuffer:
+    """Preallocated double buffer for pattern frames
+
+    The worker writes a frame into the back slot with :meth:`back` or
+    :meth:`write` and publishes it with :meth:`swap`. The GUI reads the
+    front slot inside :meth:`front`, which holds the lock so a swap cannot
+    happen while it is reading, and the worker never writes the front slot.
+    Frames are copied into memory allocated once, so no full-size array is
+    allocated per update.
+
+    With ``shared=True`` the memory is a ``multiprocessing`` shared memory
+    block and the header (front index, generations, capacities and frame
+    shapes) lives in it too, so another process can open the same buffer
+    with ``PatternBuffer(name=...)``. A frame larger than the capacity
+    grows the buffer, which moves a shared buffer to a new block; readers
+    in other processes must reopen it by :attr:`name`.
+    """
+
+    def __init__(self, capacity=None, shared=False, name=None, lock=None):
+        self.lock = lock or threading.Lock()
+        self.shared = shared or name is not None
+        self.retired = []
+
+        if name is not None:
+            self.owner = False
+            self.shm = shared_memory.SharedMemory(name=name)
+            header = np.ndarray(
+                (self.header_size(),), dtype=np.int64, buffer=self.shm.buf)
+            self.capacity = {
+                field: int(header[3 + idx])
+                for idx, (field, _) in enumerate(FIELDS)}
+            del header
+            self.map_memory()
+        else:
+            self.owner = True
+            self.capacity = dict(CAPACITY)
+            self.capacity.update(capacity or {})
+            self.allocate()
+
+    @staticmethod
+    def header_size():
+        return 3 + len(FIELDS) + 2 * len(FIELDS) * (MAX_DIMS + 1)
+
+    def layout(self):
+        """Byte offsets of every field of both slots after the header"""
+        offset = self.header_size() * 8
+        offsets = []
+        for slot in range(2):
+            slot_offsets = {}
+            for field, dtype in FIELDS:
+                offset += -offset % ALIGN
+                slot_offsets[field] = offset
+                offset += self.capacity[field] * np.dtype(dtype).itemsize
+            offsets.append(slot_offsets)
+        return offsets, offset
+
+    def allocate(self):
+        _, size = self.layout()
+        if self.shared:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.memory = self.shm.buf
+        else:
+            self.shm = None
+            self.memory = bytearray(size)
+        self.map_memory()
+        self.header[:] = 0
+        for idx, (field, _) in enumerate(FIELDS):
+            self.header[3 + idx] = self.capacity[field]
+
+    def map_memory(self):
+        if self.shm is not None:
+            self.memory = self.shm.buf
+            # References to the mapping before any view of it exists
+            self.unmapped_refs = sys.getrefcount(self.shm._mmap)
+        self.header = np.ndarray(
+            (self.header_size(),), dtype=np.int64, buffer=self.memory)
+        offsets, _ = self.layout()
+        self.slots = [
+            {field: np.ndarray(
+                (self.capacity[field],), dtype=dtype, buffer=self.memory,
+                offset=offsets[slot][field])
+             for field, dtype in FIELDS}
+            for slot in range(2)]
+
+    @property
+    def name(self):
+        return None if self.shm is None else self.shm.name
+
+    def shape_index(self, slot, field_idx):
+        start = 3 + len(FIELDS) + \
+            (slot * len(FIELDS) + field_idx) * (MAX_DIMS + 1)
+        return start
+
+    def get_shape(self, slot, field_idx):
+        start = self.shape_index(slot, field_idx)
+        ndim = int(self.header[start])
+        return tuple(int(dim) for dim in self.header[start + 1:start + 1 + ndim])
+
+    def set_shape(self, slot, field_idx, shape):
+        start = self.shape_index(slot, field_idx)
+        self.header[start] = len(shape)
+        self.header[start + 1:start + 1 + len(shape)] = shape
+
+    def grow(self, field, size):
+        """Reallocate with room for ``size`` elements of ``field``
+
+        Both slots are carried over so readers keep a valid frame and a
+        partly written back slot is not lost.
+        """
+        if not self.owner:
+            raise ValueError(
+                '{} needs {} elements but the buffer holds {}'.format(
+                    field, size, self.capacity[field]))
+
+        with self.lock:
+            old_header = self.header.copy()
+            old_slots = [
+                {field_name: slot[field_name].copy()
+                 for field_name, _ in FIELDS}
+                for slot in self.slots]
+            if self.shm is not None:
+                # Readers that have the old block open keep their mapping,
+                # new readers can only open the new one
+                self.shm.unlink()
+                self.retired.append(self.shm)
+
+            self.capacity[field] = max(size, 2 * self.capacity[field])
+            self.allocate()
+            self.close_retired()
+            self.header[:3] = old_header[:3]
+            self.header[3 + len(FIELDS):] = old_header[3 + len(FIELDS):]
+            for slot in range(2):
+                for field_name, _ in FIELDS:
+                    count = min(self.capacity[field_name],
+                                old_slots[slot][field_name].size)
+                    self.slots[slot][field_name][:count] = \
+                        old_slots[slot][field_name][:count]
+
+    def back(self, field, shape):
+        """Writable view of ``field`` in the back slot with ``shape``"""
+        field_idx = [name for name, _ in FIELDS].index(field)
+        size = int(np.prod(shape))
+        if size > self.capacity[field]:
+            self.grow(field, size)
+        slot = 1 - int(self.header[0])
+        self.set_shape(slot, field_idx, shape)
+        return self.slots[slot][field][:size].reshape(shape)
+
+    def write(self, arrays):
+        """Copy a dict of arrays into the back slot, missing fields are
+        left empty
+        """
+        for field, _ in FIELDS:
+            array = arrays.get(field)
+            if array is None:
+                self.back(field, (0,))
+                continue
+            view = self.back(field, np.shape(array))
+            # Fields written in place with back() are already there
+            if not np.shares_memory(view, array):
+                np.copyto(view, array, casting='unsafe')
+
+    def swap(self, generation):
+        """Publish the back slot as the front frame of ``generation``
+
+        Blocks replaced while the frame was written are closed here, once
+        the writer no longer holds views of them.
+        """
+        with self.lock:
+            back = 1 - int(self.header[0])
+            self.header[1 + back] = generation
+            self.header[0] = back
+        self.close_retired()
+
+    def front(self):
+        """Context manager holding the lock, yields the generation and a
+        dict of read-only views of the front frame
+        """
+        return FrontFrame(self)
+
+    def close(self):
+        """Release the memory, the buffer cannot be used afterwards
+
+        :return: True once every mapping is closed. Views of frames that
+            are still referenced keep theirs open, call again later to
+            retry.
+        """
+        if self.owner and self.shm is not None:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+        # The header and slot arrays are views of the mapping too
+        self.header = None
+        self.slots = None
+        self.memory = None
+        if self.shm is not None:
+            self.retired.append(self.shm)
+            self.shm = None
+        self.close_retired()
+        return not self.retired
+
+    def close_retired(self):
+        """Close the replaced blocks no frame view refers to anymore
+
+        Numpy views do not lock the mapping, they only hold a reference to
+        it, and closing it under them would leave their data unmapped.
+        """
+        mapped = []
+        for shm in self.retired:
+            if sys.getrefcount(shm._mmap) > self.unmapped_refs:
+                mapped.append(shm)
+                continue
+            try:
+                shm.close()
+            except BufferError:
+                mapped.append(shm)
+        self.retired = mapped
+
+
+class FrontFrame:
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def __enter__(self):
+        buffer = self.buffer
+        buffer.lock.acquire()
+        front = int(buffer.header[0])
+        frame = {}
+        for idx, (field, _) in enumerate(FIELDS):
+            shape = buffer.get_shape(front, idx)
+            view = buffer.slots[front][field][
+                :int(np.prod(shape))].reshape(shape)
+            view.flags.writeable = False
+            frame[field] = view
+        return int(buffer.header[1 + front]), frame
+
+    def __exit__(self, *args):
+        self.buffer.lock.release()
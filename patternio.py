@@ -0,0 +1,163 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+import json
+import os
+import numpy as np
+
+INDEX_FILE = 'index.jsonl'
+DATA_FILE = 'data.bin'
+
+
+class PatternWriter:
+    """Append patterns and their configs to a chunked binary container
+
+    The container is a directory holding ``data.bin``, the raw arrays of
+    every pattern written back to back, and ``index.jsonl``, one JSON line
+    per pattern with its config and the dtype, shape and byte offset of
+    each array. Every append writes its data and then its index line, so
+    the container stays readable up to the last complete pattern if the
+    writer is killed. The writer never holds more than one pattern, and an
+    existing container is appended to.
+
+    Use as a context manager or call :meth:`close` to close the files.
+    """
+
+    def __init__(self, path, dtype=np.float32):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        os.makedirs(path, exist_ok=True)
+
+        self.data = open(os.path.join(path, DATA_FILE), 'ab')
+        self.index = open(os.path.join(path, INDEX_FILE), 'a+b')
+        # Drop the partial last line of a killed writer before appending
+        self.index.seek(0)
+        content = self.index.read()
+        if not content.endswith(b'\n'):
+            self.index.truncate(content.rfind(b'\n') + 1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write_array(self, array, dtype):
+        array = np.ascontiguousarray(array, dtype=dtype)
+        # Keep every array 8-byte aligned for the memory-mapped reader
+        self.data.write(bytes(-self.data.tell() % 8))
+        record = {
+            'offset': self.data.tell(),
+            'dtype': array.dtype.str,
+            'shape': list(array.shape)
+        }
+        self.data.write(array.tobytes())
+        return record
+
+    def append(self, azimuth, elevation, pattern, config=None):
+        """Write one pattern in dB with its angle axes and config"""
+        entry = {
+            'config': config or {},
+            'azimuth': self.write_array(azimuth, np.float64),
+            'elevation': self.write_array(elevation, np.float64),
+            'pattern': self.write_array(pattern, self.dtype)
+        }
+        # The data goes first so an index line never points past it
+        self.data.flush()
+        self.index.write((json.dumps(entry) + '\n').encode())
+        self.index.flush()
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+
+class PatternReader:
+    """Memory-mapped reader of a :class:`PatternWriter` container
+
+    Items are dicts of read-only array views into the data file plus the
+    config, so slicing a pattern only reads the touched pages.
+    """
+
+    def __init__(self, path):
+        self.index = []
+        with open(os.path.join(path, INDEX_FILE), 'r') as f:
+            for line in f:
+                # A killed writer can leave a partial last line
+                if not line.endswith('\n'):
+                    break
+                self.index.append(json.loads(line))
+        data_file = os.path.join(path, DATA_FILE)
+        if os.path.getsize(data_file):
+            self.data = np.memmap(data_file, dtype=np.uint8, mode='r')
+        else:
+            self.data = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def read_array(self, record):
+        dtype = np.dtype(record['dtype'])
+        count = int(np.prod(record['shape']))
+        start = record['offset']
+        stop = start + count * dtype.itemsize
+        return self.data[start:stop].view(dtype).reshape(record['shape'])
+
+    def __getitem__(self, idx):
+        entry = self.index[idx]
+        return {
+            'config': entry['config'],
+            'azimuth': self.read_array(entry['azimuth']),
+            'elevation': self.read_array(entry['elevation']),
+            'pattern': self.read_array(entry['pattern'])
+        }
+
+
+def save_npz(file_name, azimuth, elevation, pattern, config=None):
+    """Single pattern as an NPZ file with the config as a JSON string"""
+    np.savez(file_name, azimuth=azimuth, elevation=elevation,
+             pattern=pattern, config=np.array(json.dumps(config or {})))
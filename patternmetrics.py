@@ -0,0 +1,227 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+import numpy as np
+
+# np.trapz was renamed to np.trapezoid in NumPy 2.0
+trapezoid = np.trapezoid if hasattr(np, 'trapezoid') else np.trapz
+
+
+def crossing(angle, level, idx_a, idx_b, target):
+    """Angle where ``level`` crosses ``target`` between two sample indices"""
+    size = level.shape[-1]
+    idx_a = np.clip(idx_a, 0, size - 1)
+    idx_b = np.clip(idx_b, 0, size - 1)
+    level_a = np.take_along_axis(level, idx_a[..., np.newaxis], -1)[..., 0]
+    level_b = np.take_along_axis(level, idx_b[..., np.newaxis], -1)[..., 0]
+    angle_a = angle[idx_a]
+    angle_b = angle[idx_b]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(level_b != level_a,
+                         (target - level_a) / (level_b - level_a), 0)
+    return angle_a + ratio * (angle_b - angle_a)
+
+
+def nearest_index(angle, target):
+    """Index of the sample of ``angle`` nearest to each ``target``"""
+    target = np.asarray(target, dtype=float)[..., np.newaxis]
+    return np.abs(angle - target).argmin(axis=-1)
+
+
+def local_minima(pattern):
+    """Interior samples lower than the previous and not above the next"""
+    minima = np.zeros(pattern.shape, dtype=bool)
+    minima[..., 1:-1] = (pattern[..., 1:-1] < pattern[..., :-2]) & \
+        (pattern[..., 1:-1] <= pattern[..., 2:])
+    return minima
+
+
+def lobe_peak(pattern, start):
+    """Index of the peak of the lobe around sample ``start``
+
+    The lobe reaches from ``start`` to the nearest local minimum on either
+    side, so a higher lobe elsewhere, e.g. a grating lobe, is not taken.
+
+    :param pattern: (..., n) pattern
+    :param start: sample index, one per leading axis of ``pattern``
+    """
+    size = pattern.shape[-1]
+    idx = np.arange(size)
+    start = np.broadcast_to(start, pattern.shape[:-1])[..., np.newaxis]
+    minima = local_minima(pattern)
+    left = np.where(minima & (idx < start), idx, 0).max(axis=-1)
+    right = np.where(minima & (idx > start), idx, size - 1).min(axis=-1)
+    lobe = (idx >= left[..., np.newaxis]) & (idx <= right[..., np.newaxis])
+    return np.where(lobe, pattern, -np.inf).argmax(axis=-1)
+
+
+def main_beam(azimuth, elevation, pattern, beam_az=0, beam_el=0):
+    """Azimuth and elevation index of the main beam of a 2D pattern
+
+    The peak of the lobe at the steering direction, searched along the
+    azimuth cut through ``beam_el`` and then along the elevation cut
+    through that peak. Also works on cuts, where one axis has one sample.
+
+    :param pattern: (n_az, n_el) pattern
+    """
+    el_idx = nearest_index(elevation, beam_el)
+    az_idx = lobe_peak(pattern[:, el_idx], nearest_index(azimuth, beam_az))
+    el_idx = lobe_peak(pattern[az_idx, :], el_idx)
+    return int(az_idx), int(el_idx)
+
+
+def cut_metrics(angle, pattern, grating_level=-3, beam=None):
+    """Main beam and sidelobe metrics of pattern cuts in dB
+
+    Works on a batch of cuts, every leading axis of ``pattern`` is kept in
+    the results. Values that do not exist, e.g. a null outside the visible
+    region, are NaN.
+
+    The main beam is the lobe at ``beam``, or the highest sample without
+    it. With element spacings of a wavelength or more a grating lobe can
+    be as high as the steered beam, so pass the steering angle; the
+    grating lobes then show in ``sll`` and ``grating_lobe``.
+
+    :param angle: (n,) angles in degrees
+    :param pattern: (..., n) pattern in dB
+    :param float grating_level: a lobe outside the main beam higher than
+        this level relative to the peak is a grating lobe
+    :param beam: steering angle in degrees, one per leading axis or a
+        scalar
+    :return: dict with ``peak_angle``, ``peak`` (dB), ``hpbw`` (3 dB
+        beamwidth, degrees), ``null_left``/``null_right`` (first nulls,
+        degrees), ``sll`` (peak sidelobe level relative to the peak, dB)
+        and ``grating_lobe`` (bool)
+    """
+    angle = np.asarray(angle, dtype=float)
+    pattern = np.asarray(pattern, dtype=float)
+    size = pattern.shape[-1]
+    idx = np.arange(size)
+
+    if beam is None:
+        peak_idx = np.argmax(pattern, axis=-1)
+    else:
+        peak_idx = lobe_peak(pattern, nearest_index(angle, beam))
+    peak = np.take_along_axis(pattern, peak_idx[..., np.newaxis], -1)
+    level = pattern - peak
+    peak = peak[..., 0]
+    before = idx < peak_idx[..., np.newaxis]
+    after = idx > peak_idx[..., np.newaxis]
+
+    below = level < -3
+    left = np.where(below & before, idx, -1).max(axis=-1)
+    right = np.where(below & after, idx, size).min(axis=-1)
+    hpbw = crossing(angle, level, right - 1, right, -3) - \
+        crossing(angle, level, left, left + 1, -3)
+    hpbw = np.where((left < 0) | (right >= size), np.nan, hpbw)
+
+    minima = local_minima(level)
+    maxima = np.zeros(pattern.shape, dtype=bool)
+    maxima[..., 1:-1] = (level[..., 1:-1] > level[..., :-2]) & \
+        (level[..., 1:-1] >= level[..., 2:])
+    # A lobe cut off by the edge of the visible region, like the grating
+    # lobes at +-90 degrees of a broadside array with a spacing of one
+    # wavelength, peaks at the edge sample
+    if size > 1:
+        maxima[..., 0] = level[..., 0] > level[..., 1]
+        maxima[..., -1] = level[..., -1] > level[..., -2]
+    null_left = np.where(minima & before, idx, -1).max(axis=-1)
+    null_right = np.where(minima & after, idx, size).min(axis=-1)
+
+    outside = (idx < np.maximum(null_left, 0)[..., np.newaxis]) | \
+        (idx > np.minimum(null_right, size - 1)[..., np.newaxis])
+    lobes = np.where(outside & maxima, level, -np.inf)
+    sll = np.where(outside, level, -np.inf).max(axis=-1)
+
+    return {
+        'peak_angle': angle[peak_idx],
+        'peak': peak,
+        'hpbw': hpbw,
+        'null_left': np.where(
+            null_left >= 0, angle[np.clip(null_left, 0, size - 1)], np.nan),
+        'null_right': np.where(
+            null_right < size, angle[np.clip(null_right, 0, size - 1)],
+            np.nan),
+        'sll': np.where(np.isfinite(sll), sll, np.nan),
+        'grating_lobe': (lobes > grating_level).any(axis=-1)
+    }
+
+
+def directivity(azimuth, elevation, array_factor, back=True):
+    """Directivity of planar array factors by integration over u/v
+
+    The power is integrated over the visible disc of the ``u = sin(az)``,
+    ``v = sin(el)`` grid with the ``1/cos(theta)`` Jacobian, which covers
+    the front hemisphere. Isotropic elements radiate the same pattern into
+    the back hemisphere, which doubles the radiated power.
+
+    :param bool back: add the mirrored back hemisphere, False for patterns
+        including an element pattern that does not radiate backwards
+
+    :param array_factor: (..., n_az, n_el) complex or linear amplitude
+    :return: directivity (linear) with the leading axes of
+        ``array_factor``
+    """
+    u = np.sin(np.asarray(azimuth, dtype=float) / 180 * np.pi)
+    v = np.sin(np.asarray(elevation, dtype=float) / 180 * np.pi)
+    w2 = 1 - u[:, np.newaxis] ** 2 - v[np.newaxis, :] ** 2
+    jacobian = np.where(w2 > 0, 1 / np.sqrt(np.maximum(w2, 1e-12)), 0)
+
+    power = np.abs(array_factor) ** 2
+    radiated = (2 if back else 1) * trapezoid(
+        trapezoid(power * jacobian, v, axis=-1), u, axis=-1)
+    return 4 * np.pi * power.max(axis=(-2, -1)) / radiated
+
+
+def linear_directivity(angle, array_factor):
+    """Directivity of linear array factors from a cut along the array axis
+
+    For a linear array of isotropic elements the pattern only depends on
+    ``u``, and the integral over the sphere reduces to ``2 pi`` times the
+    integral over ``u``. This does not hold with an element pattern.
+
+    :param array_factor: (..., n) complex or linear amplitude
+    """
+    u = np.sin(np.asarray(angle, dtype=float) / 180 * np.pi)
+    power = np.abs(array_factor) ** 2
+    return 2 * power.max(axis=-1) / trapezoid(power, u, axis=-1)
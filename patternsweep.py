@@ -0,0 +1,151 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import os
+import numpy as np
+
+from batchpattern import compute_patterns
+from patternengine import PatternEngine, fft_size, visible_bins
+
+# One engine per worker process, kept across chunks so configs sharing a
+# geometry hit its cache
+ENGINE = PatternEngine(64, 1)
+
+
+def sweep_configs(beam_az=(0,), beam_el=(0,), sizex=(64,), spacingx=(0.5,),
+                  windowx=('Square',), sllx=(-60,), base_config=None):
+    """Cartesian product of the swept parameters as a list of configs
+
+    The steering angles vary fastest so neighbouring configs, and thus the
+    configs of one chunk, share the same geometry and window.
+    """
+    configs = []
+    for size, spacing, window, sll, el, az in itertools.product(
+            sizex, spacingx, windowx, sllx, beam_el, beam_az):
+        config = dict(base_config or {})
+        config.update({
+            'sizex': size,
+            'spacingx': spacing,
+            'windowx': window,
+            'sllx': sll,
+            'beam_az': az,
+            'beam_el': el
+        })
+        configs.append(config)
+    return configs
+
+
+def axis_size(nfft, spacing):
+    """Number of samples ``get_pattern`` produces along one axis"""
+    if nfft == 1:
+        return 1
+    return len(visible_bins(fft_size(nfft, spacing), spacing)[0])
+
+
+def pattern_shape(config):
+    return (axis_size(config.get('nfft_az', 512),
+                      config.get('spacingx', 0.5)),
+            axis_size(config.get('nfft_el', 512),
+                      config.get('spacingy', 0.5)))
+
+
+def sweep_chunk(configs, db=True):
+    return list(compute_patterns(configs, engine=ENGINE, db=db))
+
+
+def sweep(configs, processes=None, chunk_size=64, dtype=np.float32,
+          array_factor=False):
+    """Compute the patterns of many configs on a process pool
+
+    :param list configs: configs as built by :func:`sweep_configs`
+    :param int processes: worker processes, defaults to the CPU count,
+        ``1`` computes in the calling process
+    :param int chunk_size: configs sent to a worker at once
+    :param dtype: dtype of the gathered patterns, promoted to complex for
+        ``array_factor``
+    :param bool array_factor: gather the normalized complex array factor
+        instead of the pattern in dB, e.g. for phase or beam combining
+    :return: dict with ``pattern`` (n, n_az, n_el) in dB, or
+        ``array_factor`` if requested, and the ``azimuth`` (n, n_az) and
+        ``elevation`` (n, n_el) axes. Configs with fewer samples than the
+        largest one are padded with NaN.
+    """
+    shapes = np.array([pattern_shape(config) for config in configs])
+    size_az, size_el = shapes.max(axis=0) if len(configs) else (0, 0)
+
+    if array_factor:
+        dtype = np.result_type(dtype, np.complex64)
+    pattern = np.full((len(configs), size_az, size_el), np.nan, dtype=dtype)
+    azimuth = np.full((len(configs), size_az), np.nan)
+    elevation = np.full((len(configs), size_el), np.nan)
+
+    chunks = [configs[idx:idx + chunk_size]
+              for idx in range(0, len(configs), chunk_size)]
+    if processes is None:
+        processes = os.cpu_count()
+
+    db = itertools.repeat(not array_factor)
+    if processes == 1:
+        results = map(sweep_chunk, chunks, db)
+        gather_results(results, chunk_size, pattern, azimuth, elevation)
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = executor.map(sweep_chunk, chunks, db)
+            gather_results(results, chunk_size, pattern, azimuth, elevation)
+
+    return {
+        'array_factor' if array_factor else 'pattern': pattern,
+        'azimuth': azimuth,
+        'elevation': elevation
+    }
+
+
+def gather_results(results, chunk_size, pattern, azimuth, elevation):
+    for chunk_idx, chunk in enumerate(results):
+        for offset, (az, el, AF) in enumerate(chunk):
+            idx = chunk_idx * chunk_size + offset
+            pattern[idx, :AF.shape[0], :AF.shape[1]] = AF
+            azimuth[idx, :az.shape[0]] = az
+            elevation[idx, :el.shape[0]] = el
@@ -0,0 +1,318 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+from PySide6.QtCore import QObject, Signal, Slot
+import multiprocessing
+import threading
+from calpattern import CalPattern
+from patternbuffer import FIELDS, PatternBuffer
+
+# Spawn instead of fork, forking a process with running Qt threads is unsafe
+CONTEXT = multiprocessing.get_context('spawn')
+
+
+def receive_configs(conn, engine):
+    """Feed configs and synthesis jobs from the parent into the engine
+    until it stops
+    """
+    try:
+        while 1:
+            message = conn.recv()
+            if message[0] == 'stop':
+                break
+            elif message[0] == 'synthesis':
+                _, job_id, params = message
+                engine.request_synthesis(params, job_id)
+            elif message[0] == 'cancel':
+                engine.cancel_synthesis()
+            else:
+                _, generation, config = message
+                engine.update_config(config, generation)
+    except (EOFError, OSError):
+        # The parent is gone
+        pass
+    engine.stop()
+
+
+def run_engine(conn, lock):
+    """Entry point of the engine process
+
+    Runs the ``CalPattern`` worker loop on a shared memory buffer. Frames
+    are published as ``('frame', generation, metrics, buffer_name)`` so the
+    parent can reopen the buffer after it has grown, errors of a single
+    config as ``('error', generation, message)``, and synthesis updates as
+    ``('progress', job_id, progress)`` and ``('synthesis', job_id,
+    result)``.
+    """
+    engine = CalPattern(buffer=PatternBuffer(shared=True, lock=lock))
+
+    def publish(generation, metrics):
+        conn.send(('frame', generation, metrics, engine.buffer.name))
+
+    def fail(generation, message):
+        conn.send(('error', generation, message))
+
+    def publish_progress(job_id, progress):
+        conn.send(('progress', job_id, progress))
+
+    def publish_synthesis(job_id, result):
+        conn.send(('synthesis', job_id, result))
+
+    engine.publish = publish
+    engine.fail = fail
+    engine.publish_progress = publish_progress
+    engine.publish_synthesis = publish_synthesis
+    threading.Thread(
+        target=receive_configs, args=(conn, engine), daemon=True).start()
+    try:
+        engine.cal_pattern()
+    finally:
+        engine.buffer.close()
+
+
+class ProcessCalPattern(QObject):
+    """``CalPattern`` running in a separate process
+
+    Has the same interface as ``CalPattern`` and is run the same way, with
+    ``cal_pattern`` started in a ``QThread``. Here that thread only
+    supervises the engine process: it relays configs over a pipe, reopens
+    the shared memory buffer the frames are written to, and restarts the
+    process if it dies. The config of a crashed process is computed again
+    once, a config that crashes it twice is dropped and reported with
+    ``engineFailed``. Synthesis jobs run in the engine process too, a job
+    running when the process dies is dropped.
+    """
+    patternReady = Signal(int, dict)
+    synthesisProgress = Signal(int, dict)
+    synthesisReady = Signal(int, dict)
+    engineFailed = Signal(int, str)
+
+    def __init__(self):
+        super(ProcessCalPattern, self).__init__()
+
+        # Placeholder until the engine has published its first frame
+        self.buffer = PatternBuffer(
+            capacity={field: 1 for field, _ in FIELDS})
+        # Buffers replaced by a grown one, closed on a later attach
+        self.replaced = []
+
+        self.process = None
+        self.conn = None
+        self.lock = None
+        self.running = True
+        self.condition = threading.Condition()
+        self.generation = 0
+        self.last_config = None
+        self.synthesis_id = 0
+        self.synthesis = None
+
+        # Seconds between liveness checks of the process, and the number
+        # of restarts in a row without a frame before giving up
+        self.poll_interval = 0.1
+        self.max_restarts = 5
+        self.restarts = 0
+        self.crashed_generation = None
+
+        # Superseded frames not relayed to the GUI, added to the count of
+        # the engine in the timing of the next frame
+        self.dropped = 0
+
+    def update_config(self, linear_array_config):
+        with self.condition:
+            self.generation += 1
+            self.last_config = dict(linear_array_config)
+            self.send(('config', self.generation, self.last_config))
+            return self.generation
+
+    def is_superseded(self, generation):
+        return generation != self.generation
+
+    def request_synthesis(self, params):
+        """Start a weight synthesis job in the engine process, see
+        :meth:`calpattern.CalPattern.request_synthesis`
+        """
+        with self.condition:
+            self.synthesis_id += 1
+            self.synthesis = self.synthesis_id
+            self.send(('synthesis', self.synthesis_id, dict(params)))
+            return self.synthesis_id
+
+    def cancel_synthesis(self):
+        with self.condition:
+            self.synthesis = None
+            self.send(('cancel',))
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.send(('stop',))
+
+    def send(self, message):
+        if self.conn is None:
+            return
+        try:
+            self.conn.send(message)
+        except OSError:
+            # Dead process, the supervisor restarts it
+            pass
+
+    def start_process(self):
+        with self.condition:
+            self.lock = CONTEXT.Lock()
+            self.conn, child_conn = CONTEXT.Pipe()
+            self.process = CONTEXT.Process(
+                target=run_engine, args=(child_conn, self.lock),
+                daemon=True)
+            self.process.start()
+            child_conn.close()
+            if self.last_config is not None:
+                self.send(('config', self.generation, self.last_config))
+
+    def attach(self, name):
+        """Open the engine's buffer and close the ones it replaced
+
+        A reader may have picked up the old buffer just before the swap
+        and still be waiting for the lock, so it is only closed on the next
+        attach, holding the lock so no reader is inside its ``front()``.
+        """
+        buffer = PatternBuffer(name=name, lock=self.lock)
+        with self.lock:
+            self.replaced = [old for old in self.replaced if not old.close()]
+            self.replaced.append(self.buffer)
+            self.buffer = buffer
+
+    def release(self):
+        """Remove the buffer of a dead engine process"""
+        if self.buffer.shared and self.process.exitcode:
+            try:
+                self.buffer.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def restart(self):
+        self.process.join(self.poll_interval)
+        exitcode = self.process.exitcode
+        self.conn.close()
+        self.release()
+        if not self.running:
+            return
+
+        self.restarts += 1
+        with self.condition:
+            # A synthesis job is not resumed in the new process
+            self.synthesis = None
+            generation = self.generation
+            if generation == self.crashed_generation:
+                # Crashed on this config before, wait for a new one
+                self.last_config = None
+            self.crashed_generation = generation
+
+        if self.restarts > self.max_restarts:
+            self.running = False
+            self.engineFailed.emit(
+                generation, 'Engine process failed {} times in a row, '
+                'stopped'.format(self.restarts))
+            return
+
+        self.engineFailed.emit(
+            generation, 'Engine process exited with code {}, '
+            'restarted'.format(exitcode))
+        self.start_process()
+
+    def receive(self, message):
+        if message[0] == 'error':
+            _, generation, error = message
+            self.engineFailed.emit(generation, error)
+            return
+        elif message[0] in ('progress', 'synthesis'):
+            _, job_id, value = message
+            with self.condition:
+                if job_id != self.synthesis:
+                    return
+                if message[0] == 'synthesis':
+                    self.synthesis = None
+            if message[0] == 'synthesis':
+                self.synthesisReady.emit(job_id, value)
+            else:
+                self.synthesisProgress.emit(job_id, value)
+            return
+        _, generation, metrics, name = message
+        self.restarts = 0
+        if name != self.buffer.name:
+            try:
+                self.attach(name)
+            except FileNotFoundError:
+                # Grown again since, a frame with the new name follows
+                return
+        if self.is_superseded(generation):
+            self.dropped += 1
+            return
+        if 'timing' in metrics:
+            metrics['timing']['dropped'] += self.dropped
+        self.patternReady.emit(generation, metrics)
+
+    def shutdown(self):
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+        self.release()
+        for old in self.replaced:
+            old.close()
+        self.replaced = []
+
+    @Slot()
+    def cal_pattern(self):
+        self.start_process()
+        while self.running:
+            try:
+                if not self.conn.poll(self.poll_interval):
+                    if not self.process.is_alive():
+                        self.restart()
+                    continue
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                self.restart()
+                continue
+            self.receive(message)
+        self.shutdown()
@@ -0,0 +1,142 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+import numpy as np
+
+# Segment data of the 'jet' colormap, (position, value, value) per channel
+JET = {
+    'red': ((0.0, 0, 0), (0.35, 0, 0), (0.66, 1, 1), (0.89, 1, 1),
+            (1.0, 0.5, 0.5)),
+    'green': ((0.0, 0, 0), (0.125, 0, 0), (0.375, 1, 1), (0.64, 1, 1),
+              (0.91, 0, 0), (1.0, 0, 0)),
+    'blue': ((0.0, 0.5, 0.5), (0.11, 1, 1), (0.34, 1, 1), (0.65, 0, 0),
+             (1.0, 0, 0))
+}
+
+
+def build_lut(segments, size=256):
+    """uint8 RGBA lookup table from colormap segment data"""
+    position = np.linspace(0, 1, size)
+    lut = np.full((size, 4), 255, dtype=np.uint8)
+    for channel, color in enumerate(('red', 'green', 'blue')):
+        points = np.array(segments[color])
+        lut[:, channel] = np.round(
+            np.interp(position, points[:, 0], points[:, 1]) * 255)
+    return lut
+
+
+JET_LUT = build_lut(JET)
+
+
+def map_colors(values, vmin, vmax, lut=JET_LUT, out=None):
+    """uint8 RGBA colors of ``values`` scaled from ``vmin`` to ``vmax``
+
+    :param out: optional uint8 array of shape ``values.shape + (4,)``
+    """
+    idx = (values - vmin) * ((len(lut) - 1) / (vmax - vmin))
+    # NaN would cast to an out of range index, show it at the floor
+    np.nan_to_num(idx, copy=False, nan=0)
+    np.clip(idx, 0, len(lut) - 1, out=idx)
+    return np.take(lut, idx.astype(np.intp), axis=0, out=out)
+
+
+def decimate_cut(angle, pattern, max_points):
+    """Min/max decimation of a cut to at most ``max_points`` samples
+
+    Every bin keeps its lowest and highest sample in their original order,
+    so nulls and sidelobe peaks stay visible.
+    """
+    size = pattern.shape[0]
+    if size <= max_points:
+        return angle, pattern
+
+    bins = max_points // 2
+    width = -(-size // bins)
+    padded = np.pad(pattern, (0, bins * width - size), mode='edge')
+    padded = padded.reshape(bins, width)
+    offset = np.arange(bins) * width
+    keep = np.unique(np.concatenate((offset + padded.argmin(axis=1),
+                                     offset + padded.argmax(axis=1))))
+    keep = keep[keep < size]
+    return angle[keep], pattern[keep]
+
+
+def decimate_surface(azimuth, elevation, pattern, max_points):
+    """Stride decimation of a surface to at most ``max_points`` per axis"""
+    step_az = -(-azimuth.size // max_points)
+    step_el = -(-elevation.size // max_points)
+    return (azimuth[::step_az], elevation[::step_el],
+            pattern[::step_az, ::step_el])
+
+
+def prepare_render(azimuth, elevation, pattern, min_z=-100, max_z=0,
+                   max_points=1024, max_cut_points=4096, colors_out=None):
+    """Ready-to-upload plot data of a pattern in dB
+
+    A surface is decimated to ``max_points`` per axis and gets uint8 RGBA
+    vertex colors from the lookup table. A cut (one axis of size 1) is
+    min/max decimated to ``max_cut_points`` and returned as ``angle`` and
+    ``pattern``.
+
+    :param colors_out: optional function returning the uint8 array of a
+        given shape the colors are written to
+    """
+    if azimuth.size > 1 and elevation.size > 1:
+        azimuth, elevation, pattern = decimate_surface(
+            azimuth, elevation, pattern, max_points)
+        out = None
+        if colors_out is not None:
+            out = colors_out(pattern.shape + (4,))
+        return {
+            'azimuth': azimuth,
+            'elevation': elevation,
+            'pattern': pattern,
+            'colors': map_colors(pattern, min_z, max_z, out=out)
+        }
+
+    angle = azimuth if azimuth.size > 1 else elevation
+    angle, pattern = decimate_cut(angle, pattern.ravel(), max_cut_points)
+    return {
+        'angle': angle,
+        'pattern': pattern
+    }
@@ -0,0 +1,168 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+import csv
+import json
+import time
+from collections import deque
+import numpy as np
+
+# Stages of a frame in pipeline order. The engine stages run in the worker,
+# transfer is the time from publishing a frame to the GUI picking it up
+# and the rest run on the GUI thread.
+ENGINE_STAGES = ['weights', 'fft', 'pattern']
+WORKER_STAGES = ENGINE_STAGES + ['to_db', 'metrics', 'render', 'buffer']
+GUI_STAGES = ['transfer', 'plot', 'paint']
+STAGES = WORKER_STAGES + GUI_STAGES
+COLUMNS = ['time', 'generation', 'nfft_az', 'nfft_el'] + STAGES + \
+    ['worker', 'latency', 'coalesced', 'dropped']
+
+
+def now():
+    """Monotonic clock shared by the GUI and the engine process"""
+    return time.perf_counter()
+
+
+class StageTimer:
+    """Wall time of consecutive stages
+
+    Every :meth:`mark` closes the stage that started at the previous mark,
+    so the stages of a frame add up to its total time.
+    """
+
+    def __init__(self):
+        self.start = self.last = now()
+        self.stages = {}
+
+    def mark(self, stage):
+        current = now()
+        self.stages[stage] = self.stages.get(stage, 0) + current - self.last
+        self.last = current
+
+
+class NullTimer:
+    """Stand-in for :class:`StageTimer` when timing is off"""
+    stages = {}
+
+    def mark(self, stage):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class TimingLog:
+    """Rolling log of the timing records of the last frames
+
+    Each record is a dict with the keys of ``COLUMNS``, stage times and
+    the latency in seconds. Missing stages are NaN.
+    """
+
+    def __init__(self, size=1000):
+        self.records = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self.records)
+
+    def clear(self):
+        self.records.clear()
+
+    def add(self, record):
+        self.records.append(
+            {column: record.get(column, np.nan) for column in COLUMNS})
+
+    def summary(self, frames=50):
+        """Median stage times, latency and frame rate of the last frames
+
+        :return: dict with the median of every column in seconds, the
+            95th percentile ``latency_p95``, the ``fps`` over the frames
+            and the latest ``coalesced``/``dropped`` counts
+        """
+        records = list(self.records)[-frames:]
+        if not records:
+            return {}
+        table = {column: np.array([r[column] for r in records], dtype=float)
+                 for column in COLUMNS}
+        summary = {}
+        for column in STAGES + ['worker', 'latency']:
+            values = table[column][np.isfinite(table[column])]
+            summary[column] = np.median(values) if values.size else np.nan
+        latency = table['latency'][np.isfinite(table['latency'])]
+        summary['latency_p95'] = np.percentile(latency, 95) \
+            if latency.size else np.nan
+        span = records[-1]['time'] - records[0]['time']
+        summary['fps'] = (len(records) - 1) / span if span > 0 else np.nan
+        summary['coalesced'] = records[-1]['coalesced']
+        summary['dropped'] = records[-1]['dropped']
+        return summary
+
+    def export(self, file_name):
+        """Write the log as CSV, or as JSON lines for any other extension"""
+        with open(file_name, 'w', newline='') as f:
+            if file_name.lower().endswith('.csv'):
+                writer = csv.DictWriter(f, fieldnames=COLUMNS)
+                writer.writeheader()
+                writer.writerows(self.records)
+            else:
+                for record in self.records:
+                    f.write(json.dumps(
+                        {key: None if np.isnan(value) else value
+                         for key, value in record.items()}) + '\n')
+
+
+def format_summary(summary):
+    """One line text of :meth:`TimingLog.summary` for the status bar"""
+    if not summary:
+        return ''
+
+    def ms(value):
+        return '-' if np.isnan(value) else '{:.1f}'.format(value * 1e3)
+
+    text = ['{} {}'.format(stage, ms(summary[stage])) for stage in STAGES
+            if not np.isnan(summary[stage])]
+    return '{} ms  |  latency {} ms (p95 {})  |  {:.1f} fps  |  ' \
+        'coalesced {}, dropped {}'.format(
+            ', '.join(text), ms(summary['latency']),
+            ms(summary['latency_p95']),
+            0 if np.isnan(summary['fps']) else summary['fps'],
+            int(summary['coalesced']), int(summary['dropped']))
@@ -0,0 +1,196 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+import numpy as np
+
+from patternengine import fft_size, phase_ramp
+
+
+def mask_levels(size, spacing, angle, mask, nulls=(), null_depth=-60):
+    """Upper bound in dB of every bin of a ``size``-point FFT
+
+    The mask is interpolated over ``u = sin(angle)``. Bins outside the
+    visible region are not constrained, and each null pulls the two bins
+    around its angle down to ``null_depth``.
+
+    :param angle: mask angles in degrees, increasing
+    :param mask: highest allowed level relative to the peak in dB, 0 dB or
+        more where the main beam is
+    """
+    u = np.fft.fftfreq(size) / spacing
+    levels = np.full(size, np.inf)
+    visible = np.abs(u) <= 1
+    levels[visible] = np.interp(
+        u[visible], np.sin(np.asarray(angle) / 180 * np.pi), mask)
+    for null in np.atleast_1d(nulls):
+        position = np.sin(null / 180 * np.pi) * spacing * size
+        for k in (np.floor(position), np.ceil(position)):
+            levels[int(k) % size] = null_depth
+    return levels
+
+
+def synthesis_steps(size, spacing, angle, mask, beam=0, nulls=(),
+                    null_depth=-60, nfft=4096, iterations=500, tol=0.05,
+                    initial=None):
+    """Alternating projection synthesis of the weights of one array axis
+
+    Iterative FFT method: the pattern of the weights is computed with an
+    FFT, clipped to the mask wherever it exceeds it, and transformed back,
+    keeping only the ``size`` samples of the aperture. Generator that
+    yields the progress after each iteration, so the caller can report or
+    stop it, and returns the result.
+
+    :param float beam: steering angle in degrees, the initial weights are
+        uniform weights steered there unless ``initial`` is given
+    :param nulls: angles in degrees of nulls to place
+    :param int iterations: maximum number of iterations
+    :param float tol: stop when no bin exceeds the mask by more dB
+    :return: yields dicts with ``iteration`` and ``violation``, the highest
+        excess over the mask in dB, and returns a dict with the best
+        ``weight`` (peak amplitude 1), its ``violation``, the ``pattern``
+        in dB on ``u`` and the ``history`` of violations
+    """
+    import scipy.fft
+
+    fft_length = max(fft_size(nfft, spacing), 4 * size)
+    levels = mask_levels(
+        fft_length, spacing, angle, mask, nulls, null_depth)
+    limit = 10 ** (levels / 20)
+    constrained = np.isfinite(levels)
+
+    if initial is None:
+        cycles = spacing * np.sin(beam / 180 * np.pi)
+        weight = phase_ramp(cycles * np.arange(size))
+    else:
+        weight = np.asarray(initial, dtype=complex)
+
+    best = None
+    history = []
+    for iteration in range(iterations):
+        AF = scipy.fft.fft(weight, fft_length)
+        amplitude = np.abs(AF)
+        peak = np.max(amplitude)
+        level = amplitude / peak
+
+        with np.errstate(divide='ignore'):
+            excess = 20 * np.log10(level[constrained]) - levels[constrained]
+        violation = float(np.max(excess, initial=-np.inf))
+        history.append(violation)
+        if best is None or violation < best[1]:
+            best = (weight, violation)
+        yield {'iteration': iteration, 'violation': violation}
+        if violation <= tol:
+            break
+
+        # Project onto the mask, then onto the aperture
+        over = level > limit
+        AF[over] *= limit[over] * peak / amplitude[over]
+        weight = scipy.fft.ifft(AF)[:size]
+
+    weight = best[0] / np.max(np.abs(best[0]))
+    AF = scipy.fft.fftshift(scipy.fft.fft(weight, fft_length))
+    u = scipy.fft.fftshift(np.fft.fftfreq(fft_length)) / spacing
+    return {
+        'weight': weight,
+        'violation': best[1],
+        'u': u,
+        'pattern': 20 * np.log10(np.abs(AF) / np.max(np.abs(AF)) + 1e-5),
+        'history': np.array(history)
+    }
+
+
+def array_synthesis_steps(sizex, sizey, spacingx=0.5, spacingy=0.5,
+                          mask_az=None, mask_el=None, beam_az=0, beam_el=0,
+                          nulls_az=(), nulls_el=(), **kwargs):
+    """Synthesis of separable rectangular array weights, axis by axis
+
+    Each axis with a mask is synthesized with :func:`synthesis_steps`, the
+    other keeps uniform steered weights. Yields the progress of both axes
+    with an ``axis`` key and returns a dict with ``weight_x``,
+    ``weight_y``, the (sizex, sizey) ``weight`` and the per-axis results.
+
+    :param mask_az: (angle, level) of the azimuth mask, see
+        :func:`mask_levels`
+    :param mask_el: (angle, level) of the elevation mask
+    :param kwargs: arguments of :func:`synthesis_steps`
+    """
+    results = {}
+    axes = [('x', sizex, spacingx, mask_az, beam_az, nulls_az),
+            ('y', sizey, spacingy, mask_el, beam_el, nulls_el)]
+    for axis, size, spacing, mask, beam, nulls in axes:
+        if mask is None or size == 1:
+            cycles = spacing * np.sin(beam / 180 * np.pi)
+            results['weight_' + axis] = phase_ramp(cycles * np.arange(size))
+            continue
+        steps = synthesis_steps(
+            size, spacing, mask[0], mask[1], beam=beam, nulls=nulls,
+            **kwargs)
+        while 1:
+            try:
+                progress = next(steps)
+            except StopIteration as done:
+                results[axis] = done.value
+                results['weight_' + axis] = done.value['weight']
+                break
+            progress['axis'] = axis
+            yield progress
+
+    results['weight'] = np.outer(results['weight_x'], results['weight_y'])
+    return results
+
+
+def synthesize(*args, callback=None, **kwargs):
+    """Run :func:`array_synthesis_steps` to the end
+
+    :param callback: called with the progress dict of every iteration,
+        returning True cancels the synthesis
+    :return: result of :func:`array_synthesis_steps`, None if cancelled
+    """
+    steps = array_synthesis_steps(*args, **kwargs)
+    while 1:
+        try:
+            progress = next(steps)
+        except StopIteration as done:
+            return done.value
+        if callback is not None and callback(progress):
+            steps.close()
+            return None
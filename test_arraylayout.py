@@ -0,0 +1,129 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+import numpy as np
+import pytest
+
+from arraylayout import (ArrayLayout, read_layout, save_binary,
+                         unsteered_weight)
+from directpattern import array_factor
+from patternengine import PatternEngine
+
+BEAM = (29, -7)
+
+
+def exported_frame():
+    """Active weights of a steered, tapered and coupled array"""
+    engine = PatternEngine(12, 6)
+    AF_data = engine.get_pattern(
+        nfft_az=256, nfft_el=128, beam_az=BEAM[0], beam_el=BEAM[1],
+        windowx='Taylor', sllx=-30, couplingx=0.1 - 0.05j)
+    return engine, AF_data
+
+
+def direct(layout, AF_data):
+    """Array factor of a layout by the direct sum"""
+    return array_factor(
+        layout.x, layout.y, AF_data['weight'],
+        AF_data['azimuth'][:, np.newaxis],
+        AF_data['elevation'][np.newaxis, :]) / layout.gain
+
+
+def write_csv(file_name, x, y, weight):
+    """Same table as the CSV export of the GUI"""
+    np.savetxt(file_name, np.column_stack((
+        x, y, np.abs(weight), np.angle(weight) / np.pi * 180)),
+        fmt='%1.8e', delimiter=',',
+        header='x (wavelength), y (wavelength), amplitude (linear), '
+               'phase (degree)')
+
+
+@pytest.mark.parametrize('extension', ['.csv', '.npy', '.npz'])
+def test_export_round_trip(tmp_path, extension):
+    engine, AF_data = exported_frame()
+    weight = unsteered_weight(engine.x, engine.y, AF_data['weight'].ravel(),
+                              *BEAM)
+    file_name = str(tmp_path / ('array' + extension))
+    if extension == '.csv':
+        write_csv(file_name, engine.x, engine.y, weight)
+    elif extension == '.npy':
+        save_binary(file_name, engine.x, engine.y, weight)
+    else:
+        np.savez(file_name, x=engine.x, y=engine.y, weight=weight)
+
+    layout = ArrayLayout(*read_layout(file_name))
+    imported = layout.get_pattern(nfft_az=256, nfft_el=128,
+                                  beam_az=BEAM[0], beam_el=BEAM[1])
+    np.testing.assert_allclose(imported['weight'], AF_data['weight'].ravel(),
+                               rtol=0, atol=1e-7)
+    # Both are normalized to their own gain, compare the radiated fields
+    np.testing.assert_allclose(
+        imported['array_factor'] * imported['gain'],
+        AF_data['array_factor'] * AF_data['gain'], rtol=0, atol=1e-6)
+
+
+def test_irregular_layout():
+    rng = np.random.default_rng(0)
+    x = rng.uniform(0, 6, 40)
+    y = rng.uniform(0, 3, 40)
+    layout = ArrayLayout(x, y)
+    assert layout.engine is None
+    AF_data = layout.get_pattern(nfft_az=64, nfft_el=32, beam_az=10)
+    expected = direct(layout, AF_data)
+    np.testing.assert_allclose(AF_data['array_factor'], expected, atol=1e-12)
+    peak = np.unravel_index(np.argmax(np.abs(AF_data['array_factor'])),
+                            AF_data['array_factor'].shape)
+    assert AF_data['azimuth'][peak[0]] == pytest.approx(10, abs=2)
+
+
+def test_thinned_lattice_matches_direct_sum():
+    engine = PatternEngine(10, 8, spacingx=0.6)
+    keep = np.random.default_rng(1).uniform(size=engine.x.size) > 0.3
+    x = engine.x[keep] + 1.2
+    y = engine.y[keep] - 0.5
+    layout = ArrayLayout(x, y)
+    assert layout.engine is not None
+    AF_data = layout.get_pattern(nfft_az=128, nfft_el=64, beam_az=-15,
+                                 beam_el=20)
+    expected = direct(layout, AF_data)
+    np.testing.assert_allclose(AF_data['array_factor'], expected, atol=1e-12)
@@ -0,0 +1,113 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+import json
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from batchpattern import (compute_patterns, main, pattern_kwargs,
+                          save_patterns)
+from patternio import PatternReader
+
+CONFIGS = [
+    {'sizex': 16, 'beam_az': 10, 'nfft_az': 256, 'nfft_el': 1},
+    {'sizex': 8, 'sizey': 4, 'windowx': 'Taylor', 'sllx': -30,
+     'nfft_az': 64, 'nfft_el': 32},
+    {'sizex': 12, 'windowx': 1, 'element': 'Cosine', 'couplingx': -20,
+     'nfft_az': 1, 'nfft_el': 128, 'plot_az': 5}
+]
+
+
+def test_save_patterns(tmp_path):
+    file_name = str(tmp_path / 'patterns.npz')
+    save_patterns(file_name, CONFIGS, compute_patterns(CONFIGS))
+    expected = list(compute_patterns(CONFIGS))
+    with np.load(file_name) as data:
+        assert json.loads(str(data['configs'])) == CONFIGS
+        for idx, (azimuth, elevation, pattern) in enumerate(expected):
+            np.testing.assert_array_equal(data['azimuth_%d' % idx], azimuth)
+            np.testing.assert_array_equal(
+                data['elevation_%d' % idx], elevation)
+            np.testing.assert_array_equal(data['pattern_%d' % idx], pattern)
+
+
+def test_save_patterns_streams(tmp_path):
+    """Only one pattern is held in memory while the file is written"""
+    pattern = np.zeros((512, 512))
+    count = 40
+
+    def results():
+        for _ in range(count):
+            yield np.zeros(512), np.zeros(512), pattern.copy()
+
+    tracemalloc.start()
+    save_patterns(str(tmp_path / 'patterns.npz'), [{}] * count, results())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert peak < 4 * pattern.nbytes
+    with np.load(str(tmp_path / 'patterns.npz')) as data:
+        assert len(data.files) == 1 + 3 * count
+
+
+def test_main_container(tmp_path):
+    configs = tmp_path / 'configs.jsonl'
+    configs.write_text('\n'.join(json.dumps(config) for config in CONFIGS))
+    main([str(configs), '-o', str(tmp_path / 'patterns')])
+    reader = PatternReader(str(tmp_path / 'patterns'))
+    assert [entry['config'] for entry in reader] == CONFIGS
+
+
+def test_worker_parses_configs_like_batch_mode():
+    pytest.importorskip('PySide6')
+    from calpattern import CalPattern
+
+    for config in CONFIGS:
+        worker = CalPattern()
+        worker.apply_config(config)
+        for key, value in pattern_kwargs(config).items():
+            if key == 'element':
+                assert type(getattr(worker, key)) is type(value)
+            else:
+                assert getattr(worker, key) == value
@@ -0,0 +1,129 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+import numpy as np
+
+from montecarlo import (METRICS, error_weights, monte_carlo,
+                        pattern_batches, quantize_phase)
+from patternengine import PatternEngine
+from patternmetrics import cut_metrics
+
+CUT = {'nfft_az': 512, 'nfft_el': 1, 'beam_az': 20, 'windowx': 'Taylor',
+       'sllx': -30}
+ERRORS = {'amplitude_error': 1, 'phase_error': 10, 'failure_rate': 0.05}
+
+
+def test_no_errors_give_nominal():
+    engine = PatternEngine(16, 1)
+    result = monte_carlo(engine, count=10, seed=1, **CUT)
+    np.testing.assert_allclose(result['mean'], result['nominal'], atol=1e-9)
+    np.testing.assert_allclose(result['envelopes'][0], result['nominal'],
+                               atol=1e-5)
+    nominal = cut_metrics(result['azimuth'], result['nominal'][:, 0],
+                          beam=20)
+    for name in METRICS:
+        statistics = result['statistics']['azimuth'][name]
+        np.testing.assert_allclose(statistics['mean'], nominal[name],
+                                   atol=1e-6)
+        np.testing.assert_allclose(statistics['std'], 0, atol=1e-6)
+
+
+def test_errors_lower_gain():
+    engine = PatternEngine(16, 1)
+    result = monte_carlo(engine, count=200, seed=1, **CUT, **ERRORS)
+    peak = result['metrics']['azimuth']['peak']
+    assert peak.shape == (200,)
+    assert np.mean(peak) < 0
+    assert np.all(np.abs(result['metrics']['azimuth']['peak_angle'] - 20) < 5)
+    statistics = result['statistics']['azimuth']
+    assert set(statistics) == set(METRICS)
+    assert statistics['sll']['percentiles'].shape == (3,)
+    assert np.all(np.diff(statistics['sll']['percentiles']) >= 0)
+
+
+def test_batches_do_not_change_realizations():
+    engine = PatternEngine(8, 4)
+    kwargs = dict(count=10, seed=3, nfft_az=64, nfft_el=32, **ERRORS)
+    patterns = [
+        np.concatenate([batch['pattern'] for batch in pattern_batches(
+            engine, batch_size=batch_size, **kwargs)])
+        for batch_size in (1, 3, 10)]
+    np.testing.assert_array_equal(patterns[0], patterns[1])
+    np.testing.assert_array_equal(patterns[0], patterns[2])
+
+
+def test_envelopes_default():
+    engine = PatternEngine(8, 4)
+    result = monte_carlo(engine, count=5, seed=1, nfft_az=64, nfft_el=32)
+    assert result['envelopes'] is None
+    assert set(result['metrics']) == {'azimuth', 'elevation'}
+    result = monte_carlo(engine, count=5, seed=1, nfft_az=1, nfft_el=64)
+    assert result['envelopes'].shape == (3,) + result['nominal'].shape
+    assert set(result['metrics']) == {'elevation'}
+
+
+def test_quantize_phase():
+    weight = 0.5 * np.exp(1j * np.linspace(-np.pi, np.pi, 50))
+    quantized = quantize_phase(weight, 3)
+    np.testing.assert_allclose(np.abs(quantized), 0.5)
+    steps = np.angle(quantized) / (np.pi / 4)
+    np.testing.assert_allclose(steps, np.round(steps), atol=1e-12)
+    assert np.max(np.abs(np.angle(quantized / weight))) <= np.pi / 8 + 1e-12
+
+
+def test_error_weights():
+    weight = np.exp(1j * np.arange(12.0)).reshape(4, 3)
+    rng = np.random.default_rng(0)
+    assert error_weights(weight, 5, rng).shape == (5, 4, 3)
+    np.testing.assert_array_equal(error_weights(weight, 5, rng)[2], weight)
+    np.testing.assert_array_equal(
+        error_weights(weight, 5, rng, failure_rate=1), 0)
+    failed = error_weights(weight, 100, rng, failure_rate=0.3)
+    off = failed == 0
+    np.testing.assert_array_equal(failed[~off], np.broadcast_to(
+        weight, failed.shape)[~off])
+    assert 0.2 < np.mean(off) < 0.4
+    amplitude = error_weights(weight, 2000, rng, amplitude_error=1)
+    np.testing.assert_allclose(np.angle(amplitude / weight), 0, atol=1e-12)
+    np.testing.assert_allclose(
+        np.std(20 * np.log10(np.abs(amplitude))), 1, atol=0.05)
@@ -0,0 +1,134 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+import numpy as np
+import pytest
+
+from patternbuffer import PatternBuffer
+
+
+def frame(size, value):
+    return {
+        'azimuth': np.linspace(-90, 90, size),
+        'elevation': np.zeros(1),
+        'pattern': np.full((size, 1), value),
+        'weight': np.full(4, value + 1j)
+    }
+
+
+def test_swap_publishes_back_slot():
+    buffer = PatternBuffer()
+    buffer.write(frame(11, -3.0))
+    buffer.swap(1)
+    # An unpublished frame does not change the front slot
+    buffer.write(frame(21, -5.0))
+    with buffer.front() as (generation, front):
+        assert generation == 1
+        np.testing.assert_array_equal(front['pattern'], np.full((11, 1), -3))
+        np.testing.assert_array_equal(front['weight'], np.full(4, -3 + 1j))
+        assert front['x'].shape == (0,)
+        with pytest.raises(ValueError):
+            front['pattern'][0] = 0
+    buffer.swap(2)
+    with buffer.front() as (generation, front):
+        assert generation == 2
+        assert front['pattern'].shape == (21, 1)
+        assert np.all(front['pattern'] == -5)
+    assert buffer.close()
+
+
+def test_grow_keeps_front_frame():
+    buffer = PatternBuffer(capacity={'azimuth': 8, 'pattern': 8})
+    buffer.write(frame(8, -1.0))
+    buffer.swap(1)
+    buffer.write(frame(100, -2.0))
+    assert buffer.capacity['pattern'] >= 100
+    with buffer.front() as (generation, front):
+        assert generation == 1
+        np.testing.assert_array_equal(front['pattern'], np.full((8, 1), -1))
+    buffer.swap(2)
+    with buffer.front() as (generation, front):
+        np.testing.assert_array_equal(
+            front['azimuth'], np.linspace(-90, 90, 100))
+    assert buffer.close()
+
+
+def test_shared_reader():
+    buffer = PatternBuffer(shared=True)
+    buffer.write(frame(11, -3.0))
+    buffer.swap(7)
+    reader = PatternBuffer(name=buffer.name)
+    with reader.front() as (generation, front):
+        assert generation == 7
+        np.testing.assert_array_equal(front['pattern'], np.full((11, 1), -3))
+    del front
+    with pytest.raises(ValueError):
+        reader.back('pattern', (reader.capacity['pattern'] + 1,))
+    assert reader.close()
+    assert buffer.close()
+
+
+def test_grow_retires_shared_block():
+    buffer = PatternBuffer(capacity={'pattern': 8}, shared=True)
+    name = buffer.name
+    buffer.write(frame(8, -1.0))
+    buffer.swap(1)
+    buffer.write(frame(100, -2.0))
+    buffer.swap(2)
+    assert buffer.name != name
+    assert not buffer.retired
+    assert buffer.close()
+
+
+def test_close_waits_for_views():
+    buffer = PatternBuffer(shared=True)
+    buffer.write(frame(11, -3.0))
+    buffer.swap(1)
+    with buffer.front() as (_, front):
+        pattern = front['pattern']
+    del front
+    assert not buffer.close()
+    # The held view still reads the frame
+    assert np.all(pattern == -3)
+    del pattern
+    assert buffer.close()
@@ -0,0 +1,179 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+import numpy as np
+import pytest
+
+from directpattern import array_factor
+from patternengine import (PatternEngine, fft_size, tiled_fft2, to_db,
+                           visible_bins)
+
+TOL = 1e-12
+
+
+def direct(engine, weight, azimuth, elevation, gain):
+    """Array factor of ``engine`` weights by the direct sum, one exponential
+    per element and direction
+    """
+    return array_factor(
+        engine.x, engine.y, weight, azimuth[:, np.newaxis],
+        elevation[np.newaxis, :]) / gain
+
+
+def random_weight(shape, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=shape) + 1j * rng.normal(size=shape)
+
+
+@pytest.mark.parametrize('kwargs', [
+    dict(nfft_az=128, nfft_el=64),
+    # Beam off the FFT bins, phase ramp path
+    dict(nfft_az=128, nfft_el=64, beam_az=17.3, beam_el=-6.1,
+         windowx='Taylor', sllx=-35, windowy='Chebyshev', slly=-40),
+    # Beam on an FFT bin, shifted cached spectrum
+    dict(nfft_az=128, nfft_el=64, beam_az=np.arcsin(8 / 64) / np.pi * 180),
+    dict(nfft_az=128, nfft_el=64, beam_az=25, couplingx=0.2 + 0.1j,
+         couplingy=-0.15),
+    # Fewer FFT points than elements, folded weights
+    dict(nfft_az=12, nfft_el=6, beam_az=10),
+    dict(nfft_az=256, nfft_el=1, plot_el=12, beam_az=-30,
+         windowx='Hamming'),
+    dict(nfft_az=1, nfft_el=256, plot_az=-20, beam_el=40,
+         windowy='Hanning'),
+])
+def test_get_pattern(kwargs):
+    engine = PatternEngine(24, 10, spacingx=0.5, spacingy=0.7)
+    result = engine.get_pattern(**kwargs)
+    expected = direct(engine, result['weight'], result['azimuth'],
+                      result['elevation'], result['gain'])
+    assert result['array_factor'].shape == expected.shape
+    np.testing.assert_allclose(
+        result['array_factor'], expected, rtol=0, atol=TOL)
+
+
+@pytest.mark.parametrize('nfft', [(128, 64), (256, 1), (1, 128)])
+def test_get_patterns(nfft):
+    engine = PatternEngine(16, 12)
+    beams = [(0, 0), (12.5, -3), (-40, 22)]
+    kwargs = dict(nfft_az=nfft[0], nfft_el=nfft[1], plot_az=5, plot_el=-8,
+                  windowx='Taylor', sllx=-30, couplingy=0.1)
+    result = engine.get_patterns(beams, **kwargs)
+    for idx, (beam_az, beam_el) in enumerate(beams):
+        single = engine.get_pattern(beam_az=beam_az, beam_el=beam_el,
+                                    **kwargs)
+        expected = direct(engine, result['weight'][idx], result['azimuth'],
+                          result['elevation'], single['gain'])
+        np.testing.assert_allclose(
+            result['array_factor'][idx], expected, rtol=0, atol=TOL)
+
+
+@pytest.mark.parametrize('nfft', [(128, 64), (10, 8), (256, 1), (1, 256)])
+def test_weight_pattern(nfft):
+    engine = PatternEngine(20, 14, spacingx=0.6, spacingy=0.5)
+    weight = random_weight((3, 20, 14))
+    result = engine.weight_pattern(
+        weight, nfft_az=nfft[0], nfft_el=nfft[1], plot_az=-12, plot_el=33)
+    gain = np.sum(np.abs(weight), axis=(-2, -1))
+    for idx in range(weight.shape[0]):
+        expected = direct(engine, weight[idx], result['azimuth'],
+                          result['elevation'], gain[idx])
+        np.testing.assert_allclose(
+            result['array_factor'][idx], expected, rtol=0, atol=TOL)
+
+
+def test_weight_pattern_tiled():
+    engine = PatternEngine(20, 14, max_fft_elements=512)
+    weight = random_weight((2, 20, 14), seed=1)
+    result = engine.weight_pattern(weight, nfft_az=96, nfft_el=64)
+    gain = np.sum(np.abs(weight), axis=(-2, -1))
+    for idx in range(weight.shape[0]):
+        expected = direct(engine, weight[idx], result['azimuth'],
+                          result['elevation'], gain[idx])
+        np.testing.assert_allclose(
+            result['array_factor'][idx], expected, rtol=0, atol=TOL)
+
+
+@pytest.mark.parametrize('size', [(64, 32), (16, 8)])
+def test_tiled_fft2(size):
+    weight = random_weight((40, 24), seed=2)
+    az_bins, _ = visible_bins(fft_size(size[0], 0.5), 0.5)
+    el_bins, _ = visible_bins(fft_size(size[1], 0.5), 0.5)
+    AF = tiled_fft2(weight, size[0], size[1], az_bins, el_bins,
+                    max_elements=100)
+    n = np.arange(weight.shape[0])[:, np.newaxis]
+    m = np.arange(weight.shape[1])[np.newaxis, :]
+    expected = np.array([[np.sum(weight * np.exp(
+        -1j * 2 * np.pi * (k * n / size[0] + l * m / size[1])))
+        for l in el_bins] for k in az_bins])
+    gain = np.sum(np.abs(weight))
+    np.testing.assert_allclose(AF / gain, expected / gain, rtol=0, atol=TOL)
+
+
+def test_zero_gain():
+    engine = PatternEngine(2, 2)
+    result = engine.get_pattern(windowx='Hanning', nfft_az=64, nfft_el=64)
+    assert np.all(np.isfinite(result['array_factor']))
+    result = engine.weight_pattern(np.zeros((2, 2)), nfft_az=64, nfft_el=1)
+    assert np.all(np.isfinite(result['array_factor']))
+
+
+@pytest.mark.parametrize('size, beam, window', [
+    ((256, 256), (17.3, -5.2), 'Taylor'),
+    ((256, 256), (40, 30), 'Chebyshev'),
+    ((1024, 64), (-33.3, 12.1), 'Taylor'),
+])
+def test_single_precision(size, beam, window):
+    """Accuracy of precision='single' as stated in the engine docstring"""
+    engine = PatternEngine(*size)
+    kwargs = dict(nfft_az=512, nfft_el=512, beam_az=beam[0],
+                  beam_el=beam[1], windowx=window, sllx=-40,
+                  windowy=window, slly=-40)
+    double = engine.get_pattern(**kwargs)['array_factor']
+    single = engine.get_pattern(precision='single', **kwargs)['array_factor']
+    assert single.dtype == np.complex64
+    assert np.abs(single - double).max() < 1e-7
+
+    double = to_db(double)
+    error = np.abs(to_db(single.astype(complex)) - double)
+    assert error[double > -60].max() < 0.001
+    assert error.max() < 0.01
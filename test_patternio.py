@@ -0,0 +1,123 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+import json
+import os
+
+import numpy as np
+
+from patternio import INDEX_FILE, PatternReader, PatternWriter, save_npz
+
+AZIMUTH = np.linspace(-90, 90, 31)
+ELEVATION = np.linspace(-45, 45, 7)
+
+
+def pattern(value):
+    return np.full((AZIMUTH.size, ELEVATION.size), value) + \
+        np.arange(AZIMUTH.size)[:, np.newaxis] / 10
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'patterns')
+    with PatternWriter(path) as writer:
+        writer.append(AZIMUTH, ELEVATION, pattern(-10), {'sizex': 16})
+        writer.append(AZIMUTH[:5], ELEVATION[:1], pattern(-20)[:5, :1])
+    reader = PatternReader(path)
+    assert len(reader) == 2
+    entries = list(reader)
+    assert entries[0]['config'] == {'sizex': 16}
+    assert entries[1]['config'] == {}
+    np.testing.assert_array_equal(entries[0]['azimuth'], AZIMUTH)
+    np.testing.assert_array_equal(entries[0]['elevation'], ELEVATION)
+    assert entries[0]['pattern'].dtype == np.float32
+    np.testing.assert_allclose(entries[0]['pattern'], pattern(-10),
+                               rtol=1e-6)
+    np.testing.assert_allclose(entries[1]['pattern'], pattern(-20)[:5, :1],
+                               rtol=1e-6)
+
+
+def test_reopen_appends(tmp_path):
+    path = str(tmp_path / 'patterns')
+    with PatternWriter(path, dtype=np.float64) as writer:
+        writer.append(AZIMUTH, ELEVATION, pattern(-10), {'index': 0})
+    with PatternWriter(path, dtype=np.float64) as writer:
+        writer.append(AZIMUTH, ELEVATION, pattern(-20), {'index': 1})
+    reader = PatternReader(path)
+    assert [entry['config']['index'] for entry in reader] == [0, 1]
+    np.testing.assert_array_equal(reader[1]['pattern'], pattern(-20))
+
+
+def test_partial_index_line(tmp_path):
+    """A killed writer leaves a partial line, readers skip it and the next
+    writer drops it
+    """
+    path = str(tmp_path / 'patterns')
+    with PatternWriter(path) as writer:
+        writer.append(AZIMUTH, ELEVATION, pattern(-10), {'index': 0})
+    with open(os.path.join(path, INDEX_FILE), 'ab') as f:
+        f.write(b'{"config": {"index": 1}, "azim')
+    assert len(PatternReader(path)) == 1
+
+    with PatternWriter(path) as writer:
+        writer.append(AZIMUTH, ELEVATION, pattern(-30), {'index': 2})
+    with open(os.path.join(path, INDEX_FILE)) as f:
+        lines = f.read().splitlines()
+    assert [json.loads(line)['config']['index'] for line in lines] == [0, 2]
+    np.testing.assert_allclose(PatternReader(path)[1]['pattern'],
+                               pattern(-30), rtol=1e-6)
+
+
+def test_empty_container(tmp_path):
+    path = str(tmp_path / 'patterns')
+    PatternWriter(path).close()
+    assert len(PatternReader(path)) == 0
+
+
+def test_save_npz(tmp_path):
+    file_name = str(tmp_path / 'pattern.npz')
+    save_npz(file_name, AZIMUTH, ELEVATION, pattern(-10), {'sizex': 16})
+    with np.load(file_name) as data:
+        np.testing.assert_array_equal(data['azimuth'], AZIMUTH)
+        np.testing.assert_array_equal(data['elevation'], ELEVATION)
+        np.testing.assert_array_equal(data['pattern'], pattern(-10))
+        assert json.loads(str(data['config'])) == {'sizex': 16}
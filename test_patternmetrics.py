@@ -0,0 +1,151 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+import numpy as np
+import pytest
+
+from elementpattern import CosineElement
+from patternengine import PatternEngine, to_db
+from patternmetrics import (cut_metrics, directivity, linear_directivity,
+                            main_beam, trapezoid)
+
+
+def azimuth_cut(size, spacing, beam_az, nfft=4096):
+    engine = PatternEngine(size, 1, spacingx=spacing)
+    AF_data = engine.get_pattern(nfft_az=nfft, nfft_el=1, beam_az=beam_az)
+    return AF_data['azimuth'], to_db(AF_data['array_factor'][:, 0])
+
+
+def uniform_hpbw(size, spacing, beam):
+    """3 dB beamwidth of a uniform linear array in degrees"""
+    return np.degrees(0.8859 / (size * spacing * np.cos(np.radians(beam))))
+
+
+def test_uniform_broadside():
+    azimuth, pattern = azimuth_cut(64, 0.5, 0)
+    metrics = cut_metrics(azimuth, pattern, beam=0)
+    assert metrics['peak_angle'] == pytest.approx(0)
+    assert metrics['hpbw'] == pytest.approx(uniform_hpbw(64, 0.5, 0), rel=0.01)
+    assert metrics['sll'] == pytest.approx(-13.26, abs=0.05)
+    null = np.degrees(np.arcsin(1 / 32))
+    assert metrics['null_left'] == pytest.approx(-null, abs=0.05)
+    assert metrics['null_right'] == pytest.approx(null, abs=0.05)
+    assert not metrics['grating_lobe']
+
+
+@pytest.mark.parametrize('beam', [10, 0, -35])
+def test_grating_lobe_is_not_the_main_beam(beam):
+    azimuth, pattern = azimuth_cut(64, 1.0, beam)
+    metrics = cut_metrics(azimuth, pattern, beam=beam)
+    assert metrics['peak_angle'] == pytest.approx(beam, abs=0.05)
+    assert metrics['hpbw'] == pytest.approx(
+        uniform_hpbw(64, 1.0, beam), rel=0.01)
+    assert metrics['null_left'] < beam < metrics['null_right']
+    # The grating lobe is as high as the beam
+    assert metrics['sll'] > -1
+    assert metrics['grating_lobe']
+
+
+def test_batch_beams():
+    engine = PatternEngine(32, 1, spacingx=1.0)
+    beams = np.array([[-20, 0], [5, 0], [30, 0]])
+    AF_data = engine.get_patterns(beams, nfft_az=2048, nfft_el=1)
+    metrics = cut_metrics(AF_data['azimuth'],
+                          to_db(AF_data['array_factor'][:, :, 0]),
+                          beam=beams[:, 0])
+    np.testing.assert_allclose(metrics['peak_angle'], beams[:, 0], atol=0.1)
+    assert metrics['grating_lobe'].all()
+
+
+def test_main_beam():
+    engine = PatternEngine(16, 16, spacingx=1.0, spacingy=1.0)
+    AF_data = engine.get_pattern(nfft_az=512, nfft_el=512, beam_az=20,
+                                 beam_el=-10)
+    az_idx, el_idx = main_beam(
+        AF_data['azimuth'], AF_data['elevation'],
+        to_db(AF_data['array_factor']), 20, -10)
+    assert AF_data['azimuth'][az_idx] == pytest.approx(20, abs=0.3)
+    assert AF_data['elevation'][el_idx] == pytest.approx(-10, abs=0.3)
+
+
+def sphere_directivity(size, spacing, element_q=None):
+    """Directivity of a uniform square array by integration over theta
+    and phi, over both hemispheres for isotropic elements
+    """
+    theta = np.linspace(0, np.pi if element_q is None else np.pi / 2, 1001)
+    phi = np.linspace(0, 2 * np.pi, 2001)
+    theta_, phi_ = np.meshgrid(theta, phi, indexing='ij')
+    power = 1
+    for sine in (np.sin(theta_) * np.cos(phi_),
+                 np.sin(theta_) * np.sin(phi_)):
+        # Uniform array factor normalized to 1 at broadside
+        x = np.pi * spacing * sine
+        small = np.abs(np.sin(x)) < 1e-12
+        power = power * np.where(
+            small, 1, np.sin(size * x) / (size * np.where(small, 1,
+                                                          np.sin(x)))) ** 2
+    if element_q is not None:
+        power = power * np.cos(theta_) ** (2 * element_q)
+    radiated = trapezoid(
+        trapezoid(power * np.sin(theta_), phi, axis=1), theta)
+    return 4 * np.pi / radiated
+
+
+@pytest.mark.parametrize('element_q', [None, 1])
+def test_directivity(element_q):
+    engine = PatternEngine(16, 16)
+    element = None if element_q is None else CosineElement(element_q)
+    AF_data = engine.get_pattern(nfft_az=512, nfft_el=512, element=element)
+    value = directivity(AF_data['azimuth'], AF_data['elevation'],
+                        AF_data['array_factor'], back=element is None)
+    assert value == pytest.approx(sphere_directivity(16, 0.5, element_q),
+                                  rel=0.01)
+
+
+def test_linear_directivity():
+    engine = PatternEngine(32, 1)
+    AF_data = engine.get_pattern(nfft_az=4096, nfft_el=1, beam_az=20)
+    # A uniform linear array with half wavelength spacing has D = N
+    assert linear_directivity(AF_data['azimuth'],
+                              AF_data['array_factor'][:, 0]) == \
+        pytest.approx(32, rel=0.01)
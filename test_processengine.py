@@ -0,0 +1,146 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip('PySide6')
+
+from PySide6.QtCore import QCoreApplication  # noqa: E402
+from processengine import ProcessCalPattern  # noqa: E402
+from synthesis import array_synthesis_steps  # noqa: E402
+
+CONFIG = {'sizex': 32, 'sizey': 1, 'beam_az': 10, 'nfft_az': 1024,
+          'nfft_el': 1}
+ANGLE = np.linspace(-90, 90, 361)
+MASK = np.where(np.abs(ANGLE - 10) < 8, 0, -25.0)
+
+
+def process_events(duration=0):
+    """Deliver the signals queued by the supervisor thread"""
+    app = QCoreApplication.instance() or QCoreApplication([])
+    start = time.time()
+    while 1:
+        app.processEvents()
+        if time.time() - start >= duration:
+            break
+        time.sleep(0.01)
+
+
+def wait_for(condition, timeout=60):
+    start = time.time()
+    while not condition():
+        if time.time() - start > timeout:
+            raise TimeoutError
+        process_events()
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def engine():
+    engine = ProcessCalPattern()
+    thread = threading.Thread(target=engine.cal_pattern)
+    thread.start()
+    yield engine
+    engine.stop()
+    thread.join()
+
+
+def test_pattern(engine):
+    frames = []
+    engine.patternReady.connect(
+        lambda generation, metrics: frames.append((generation, metrics)))
+    generation = engine.update_config(CONFIG)
+    wait_for(lambda: frames and frames[-1][0] == generation)
+    assert frames[-1][1]['azimuth']['peak_angle'] == \
+        pytest.approx(10, abs=0.2)
+    with engine.buffer.front() as (front, frame):
+        assert front == generation
+        assert frame['pattern'].shape == (frame['azimuth'].size, 1)
+
+
+def test_synthesis(engine):
+    progress = []
+    ready = []
+    engine.synthesisProgress.connect(
+        lambda job_id, value: progress.append(job_id))
+    engine.synthesisReady.connect(
+        lambda job_id, result: ready.append((job_id, result)))
+    engine.update_config(CONFIG)
+    params = {'mask_az': (ANGLE, MASK), 'iterations': 50}
+    job_id = engine.request_synthesis(params)
+    wait_for(lambda: ready)
+
+    assert ready[0][0] == job_id
+    assert set(progress) == {job_id}
+    steps = array_synthesis_steps(32, 1, beam_az=10, **params)
+    while 1:
+        try:
+            next(steps)
+        except StopIteration as done:
+            expected = done.value
+            break
+    np.testing.assert_allclose(ready[0][1]['weight'], expected['weight'])
+
+
+def test_cancel_synthesis(engine):
+    progress = []
+    ready = []
+    engine.synthesisProgress.connect(
+        lambda job_id, value: progress.append(job_id))
+    engine.synthesisReady.connect(
+        lambda job_id, result: ready.append(job_id))
+    engine.update_config(CONFIG)
+    engine.request_synthesis({'mask_az': (ANGLE, MASK),
+                              'iterations': 10 ** 6, 'tol': 0})
+    wait_for(lambda: progress)
+    engine.cancel_synthesis()
+    # Progress sent before the cancel arrived may still come in
+    process_events(0.5)
+    count = len(progress)
+    process_events(0.5)
+    assert len(progress) == count
+    assert not ready
@@ -0,0 +1,122 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+import numpy as np
+
+from directpattern import array_factor
+from synthesis import mask_levels, synthesis_steps, synthesize
+
+SIZE = 24
+ANGLE = np.linspace(-90, 90, 721)
+MASK = np.where(np.abs(ANGLE - 10) < 12, 3, -25.0)
+
+
+def direct_pattern(weight, angle, spacing=0.5):
+    """Normalized pattern in dB of one axis of weights by the direct sum"""
+    x = np.arange(weight.size) * spacing
+    AF = array_factor(x, np.zeros_like(x), weight, angle, 0)
+    return 20 * np.log10(np.abs(AF) / np.max(np.abs(AF)))
+
+
+def run(*args, **kwargs):
+    steps = synthesis_steps(*args, **kwargs)
+    progress = []
+    while 1:
+        try:
+            progress.append(next(steps))
+        except StopIteration as done:
+            return progress, done.value
+
+
+def test_mask_met():
+    progress, result = run(SIZE, 0.5, ANGLE, MASK, beam=10)
+    assert result['violation'] <= 0.05
+    assert len(progress) == len(result['history'])
+    assert result['violation'] == np.min(result['history'])
+    np.testing.assert_allclose(np.max(np.abs(result['weight'])), 1)
+
+    # Checked against the direct sum, between the FFT bins too
+    pattern = direct_pattern(result['weight'], ANGLE)
+    assert np.argmax(pattern) == np.argmin(np.abs(ANGLE - 10))
+    sidelobes = np.abs(ANGLE - 10) >= 12
+    assert np.max(pattern[sidelobes]) < -25 + 0.5
+
+
+def test_nulls():
+    _, result = run(SIZE, 0.5, ANGLE, MASK, beam=10, nulls=(-40, 45),
+                    null_depth=-60)
+    pattern = direct_pattern(result['weight'], ANGLE)
+    assert np.all(pattern[np.isin(ANGLE, (-40, 45))] < -45)
+
+
+def test_mask_levels():
+    levels = mask_levels(64, 0.75, ANGLE, MASK)
+    u = np.fft.fftfreq(64) / 0.75
+    assert np.all(np.isinf(levels[np.abs(u) > 1]))
+    assert np.all(np.isfinite(levels[np.abs(u) <= 1]))
+    assert levels[0] == 3
+
+
+def test_cancel():
+    calls = []
+
+    def callback(progress):
+        calls.append(progress)
+        return progress['iteration'] == 2
+
+    assert synthesize(SIZE, 1, mask_az=(ANGLE, MASK), beam_az=10,
+                      tol=-1, callback=callback) is None
+    assert len(calls) == 3
+
+
+def test_array_weights():
+    result = synthesize(16, 8, mask_az=(ANGLE, MASK), beam_az=10,
+                        beam_el=-20, iterations=20)
+    assert result['weight'].shape == (16, 8)
+    np.testing.assert_allclose(
+        result['weight'], np.outer(result['weight_x'], result['weight_y']))
+    assert 'y' not in result
+    # The axis without a mask keeps uniform weights steered to its beam
+    pattern = direct_pattern(result['weight_y'], ANGLE)
+    assert ANGLE[np.argmax(pattern)] == -20
+    np.testing.assert_allclose(np.abs(result['weight_y']), 1)
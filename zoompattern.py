@@ -0,0 +1,156 @@
+"""
+    Antenna Array Analysis
+
+    Copyright (C) 2019  Zhengyu Peng
+    E-mail: zpeng.me@gmail.com
+    Website: https://zpeng.me
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+    `                      `
+    -:.                  -#:
+    -//:.              -###:
+    -////:.          -#####:
+    -/:.://:.      -###++##:
+    ..   `://:-  -###+. :##:
+           `:/+####+.   :##:
+    .::::::::/+###.     :##:
+    .////-----+##:    `:###:
+     `-//:.   :##:  `:###/.
+       `-//:. :##:`:###/.
+         `-//:+######/.
+           `-/+####/.
+             `+##+.
+              :##:
+              :##:
+              :##:
+              :##:
+              :##:
+               .+:
+
+"""
+
+import numpy as np
+from scipy.signal import czt
+
+
+def local_extrema(amplitude):
+    """Indices of the local minima and maxima of a 1-D amplitude"""
+    slope = np.sign(np.diff(amplitude))
+    turn = np.diff(slope)
+    minima = np.where(turn > 0)[0] + 1
+    maxima = np.where(turn < 0)[0] + 1
+    return minima, maxima
+
+
+def zoom_array_factor(weight, spacing, u_start, u_stop, num):
+    """Array factor of a linear weight vector on a dense ``u`` window
+
+    Evaluated with a chirp-z transform, i.e. ``num`` samples of
+    ``sum(w_n exp(-j 2 pi d n u))`` for ``u`` in ``[u_start, u_stop]`` in
+    O((N + num) log(N + num)) instead of a global zero-padded FFT.
+    """
+    u = np.linspace(u_start, u_stop, num)
+    step = u[1] - u[0] if num > 1 else 0
+    a = np.exp(1j * 2 * np.pi * spacing * u_start)
+    w = np.exp(-1j * 2 * np.pi * spacing * step)
+    return u, czt(weight, num, w, a)
+
+
+def refine_pattern(engine, axis='azimuth', nfft=1024, density=512,
+                   sidelobes=2, plot_az=None, plot_el=None,
+                   **pattern_kwargs):
+    """Coarse cut refined around the main beam, first nulls and sidelobes
+
+    A coarse ``nfft``-point cut is computed with ``engine.get_pattern``.
+    The main lobe up to one coarse bin past its first nulls and the
+    ``sidelobes`` highest sidelobes (one coarse bin each side) are then
+    re-evaluated with ``density`` points each by a chirp-z transform.
+
+    :param engine: :class:`patternengine.PatternEngine`
+    :param str axis: 'azimuth' for a cut at ``plot_el``, 'elevation' for
+        a cut at ``plot_az``
+    :param pattern_kwargs: steering, window and element arguments of
+        ``get_pattern``
+    :return: dict with the coarse cut, the refined ``windows`` as
+        ``(angle, array_factor)`` pairs, and the merged ``angle`` and
+        ``array_factor`` sorted by angle
+    """
+    if axis == 'azimuth':
+        AF_data = engine.get_pattern(
+            nfft_az=nfft, nfft_el=1, plot_el=plot_el, **pattern_kwargs)
+        angle = AF_data['azimuth']
+        coarse = AF_data['array_factor'][:, 0]
+        v = np.sin(AF_data['elevation'][0] / 180 * np.pi)
+        spacing = engine.spacingx
+        weight = AF_data['weight'].dot(
+            np.exp(-1j * 2 * np.pi * engine.spacingy * v *
+                   np.arange(engine.sizey)))
+    else:
+        AF_data = engine.get_pattern(
+            nfft_az=1, nfft_el=nfft, plot_az=plot_az, **pattern_kwargs)
+        angle = AF_data['elevation']
+        coarse = AF_data['array_factor'][0, :]
+        u = np.sin(AF_data['azimuth'][0] / 180 * np.pi)
+        spacing = engine.spacingy
+        weight = np.exp(-1j * 2 * np.pi * engine.spacingx * u *
+                        np.arange(engine.sizex)).dot(AF_data['weight'])
+
+    gain = AF_data['gain']
+    element = pattern_kwargs.get('element')
+    u_coarse = np.sin(angle / 180 * np.pi)
+    amplitude = np.abs(coarse)
+    minima, maxima = local_extrema(amplitude)
+
+    peak = np.argmax(amplitude)
+    left = minima[minima < peak]
+    right = minima[minima > peak]
+    null_left = left[-1] if left.size else 0
+    null_right = right[0] if right.size else amplitude.size - 1
+    spans = [(max(null_left - 1, 0), min(null_right + 1, amplitude.size - 1))]
+
+    lobes = maxima[(maxima < null_left) | (maxima > null_right)]
+    lobes = lobes[np.argsort(amplitude[lobes])[::-1][:sidelobes]]
+    for lobe in lobes:
+        spans.append((max(lobe - 1, 0), min(lobe + 1, amplitude.size - 1)))
+
+    windows = []
+    refined = np.zeros(amplitude.size, dtype=bool)
+    for start, stop in spans:
+        u_window, AF_window = zoom_array_factor(
+            weight, spacing, u_coarse[start], u_coarse[stop], density)
+        angle_window = np.arcsin(np.clip(u_window, -1, 1)) / np.pi * 180
+        AF_window /= gain
+        if element is not None and axis == 'azimuth':
+            AF_window *= element.sample(
+                angle_window, AF_data['elevation'])[:, 0]
+        elif element is not None:
+            AF_window *= element.sample(
+                AF_data['azimuth'], angle_window)[0, :]
+        windows.append((angle_window, AF_window))
+        refined[start:stop + 1] = True
+
+    merged_angle = np.concatenate(
+        [angle[~refined]] + [window[0] for window in windows])
+    merged_AF = np.concatenate(
+        [coarse[~refined]] + [window[1] for window in windows])
+    order = np.argsort(merged_angle, kind='stable')
+
+    return {
+        'coarse_angle': angle,
+        'coarse_array_factor': coarse,
+        'windows': windows,
+        'angle': merged_angle[order],
+        'array_factor': merged_AF[order]
+    }